@@ -2,18 +2,66 @@
     AIO Measures
     ~~~~~~~~~~~~
 
+    Submodules are imported on first access to their attributes, so that
+    importing the package stays cheap. ``__version__`` is resolved on
+    first access as well, from Python 3.7.
 """
 
-from ._version import get_versions
-from .checks import *
-from .clients import *
-from .events import *
-from .metrics import *
+import sys
+from .util import lazy_attributes
 
-__all__ = (checks.__all__
-           + clients.__all__
-           + events.__all__
-           + metrics.__all__)
+__all__ = [
+    'Aggregator',
+    'CardinalityLimiter',
+    'Check',
+    'CountingMetric',
+    'Datadog',
+    'Event',
+    'GaugeMetric',
+    'HistogramMetric',
+    'HyperLogLog',
+    'Metric',
+    'Milliseconds',
+    'Prometheus',
+    'SetMetric',
+    'Sketch',
+    'StatsD',
+    'TagSet',
+    'TimingMetric',
+]
 
-__version__ = get_versions()['version']
-del get_versions
+_attributes = {
+    'Aggregator': '.aggregators',
+    'CardinalityLimiter': '.limiters',
+    'Check': '.checks',
+    'CountingMetric': '.metrics',
+    'Datadog': '.clients',
+    'Event': '.events',
+    'GaugeMetric': '.metrics',
+    'HistogramMetric': '.metrics',
+    'HyperLogLog': '.limiters',
+    'Metric': '.metrics',
+    'Milliseconds': '.metrics',
+    'Prometheus': '.clients',
+    'SetMetric': '.metrics',
+    'Sketch': '.sketches',
+    'StatsD': '.clients',
+    'TagSet': '.tags',
+    'TimingMetric': '.metrics',
+}
+
+_getattr, __dir__ = lazy_attributes(__name__, _attributes, globals())
+
+
+def __getattr__(name):
+    if name == '__version__':
+        # versioneer may run git from a source checkout
+        from ._version import get_versions
+        value = globals()['__version__'] = get_versions()['version']
+        return value
+    return _getattr(name)
+
+
+if sys.version_info < (3, 7):
+    # modules cannot define __getattr__
+    __getattr__('__version__')
@@ -0,0 +1,194 @@
+from aiomeasures.metrics import CountingMetric, GaugeMetric, SetMetric
+from aiomeasures.metrics import HistogramMetric, TimingMetric
+from aiomeasures.sketches import Sketch
+from aiomeasures.tags import TagSet
+from collections.abc import Mapping
+
+__all__ = ['Aggregator']
+
+
+class Aggregator:
+    """Merges metrics of the same series between two flushes.
+
+    A series is identified by the metric type, its name, its rate
+    and its tags. Counters are summed, gauges keep their last value
+    (delta gauges are summed) and sets keep each value only once.
+
+    Daemons read ``-N|g`` as a decrement: negative gauges are sent as
+    ``0|g`` followed by the ``-N|g`` delta, and delta gauges summing to
+    zero are not sent at all.
+
+    With ``sketches``, timings and histograms are summarized into a
+    :class:`Sketch` per series, which is emitted as ``<name>.count``
+    counter and ``<name>.min``, ``.max``, ``.avg`` and ``.p<N>`` gauges.
+    """
+
+    def __init__(self, *, sketches=False, relative_accuracy=0.01,
+                 max_bins=2048, percentiles=(0.5, 0.95, 0.99)):
+        """
+        Parameters:
+            sketches (bool): summarize timings and histograms
+            relative_accuracy (float): error tolerated on percentiles
+            max_bins (int): bounds memory of each sketch
+            percentiles (tuple): percentiles emitted, between 0 and 1
+        """
+        self.counters = {}
+        self.gauges = {}
+        self.sets = {}
+        self.sketches = {}
+        self.absorbed = 0
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.percentiles = [(q, 'p%g' % (q * 100)) for q in percentiles]
+        self._handlers = {
+            CountingMetric: self.add_counter,
+            GaugeMetric: self.add_gauge,
+            SetMetric: self.add_set,
+        }
+        if sketches:
+            self._handlers[HistogramMetric] = self.add_sample
+            self._handlers[TimingMetric] = self.add_sample
+
+    def __len__(self):
+        return (len(self.counters) + len(self.gauges)
+                + len(self.sets) + len(self.sketches))
+
+    def clear(self):
+        self.counters.clear()
+        self.gauges.clear()
+        self.sets.clear()
+        self.sketches.clear()
+        self.absorbed = 0
+
+    def add(self, metric):
+        """Absorbs metric.
+
+        Returns:
+            bool: False if metric cannot be aggregated
+        """
+        handler = self._handlers.get(metric.__class__)
+        if handler is None or metric.value is None:
+            return False
+        handler(metric)
+        self.absorbed += 1
+        return True
+
+    def add_counter(self, metric):
+        key = series_key(metric)
+        current = self.counters.get(key)
+        if current is None:
+            self.counters[key] = CountingMetric(metric.name, metric.value,
+                                                rate=metric.rate,
+                                                tags=metric.tags)
+        else:
+            current.value += metric.value
+
+    def add_gauge(self, metric):
+        key = series_key(metric)
+        current = self.gauges.get(key)
+        if current is None:
+            self.gauges[key] = GaugeMetric(metric.name, metric.value,
+                                           rate=metric.rate,
+                                           delta=metric.delta,
+                                           tags=metric.tags)
+        elif metric.delta:
+            current.value += metric.value
+        else:
+            current.value = metric.value
+            current.delta = False
+
+    def add_set(self, metric):
+        key = series_key(metric)
+        current = self.sets.get(key)
+        if current is None:
+            self.sets[key] = current = (metric, set())
+        current[1].add(metric.value)
+
+    def add_sample(self, metric):
+        self.sketch(metric).add(metric.value)
+
+    def add_samples(self, cls, name, values, rate=None, tags=None):
+        """Absorbs values of a series at once.
+
+        Returns:
+            bool: False if values of cls are not summarized
+        """
+        if self._handlers.get(cls) != self.add_sample:
+            return False
+        self.sketch(cls(name, None, rate=rate, tags=tags)).update(values)
+        self.absorbed += len(values)
+        return True
+
+    def sketch(self, metric):
+        """Returns the sketch of the series of metric.
+        """
+        key = metric.__class__, series_key(metric)
+        current = self.sketches.get(key)
+        if current is None:
+            sketch = Sketch(self.relative_accuracy, self.max_bins)
+            self.sketches[key] = current = (metric, sketch)
+        return current[1]
+
+    def flush(self):
+        """Yields one metric per series and per set value, then resets.
+        """
+        counters, self.counters = self.counters, {}
+        gauges, self.gauges = self.gauges, {}
+        sets, self.sets = self.sets, {}
+        sketches, self.sketches = self.sketches, {}
+        yield from counters.values()
+        for metric in gauges.values():
+            yield from settle_gauge(metric)
+        for metric, values in sets.values():
+            for value in values:
+                yield SetMetric(metric.name, value,
+                                rate=metric.rate,
+                                tags=metric.tags)
+        for metric, sketch in sketches.values():
+            yield from self.summarize(metric, sketch)
+
+    def summarize(self, metric, sketch):
+        """Yields the series derived from sketch.
+        """
+        name, tags = metric.name, metric.tags
+        yield CountingMetric('%s.count' % name, sketch.count,
+                             rate=metric.rate, tags=tags)
+        gauges = [('min', sketch.min), ('max', sketch.max),
+                  ('avg', sketch.avg)]
+        gauges.extend((suffix, sketch.quantile(q))
+                      for q, suffix in self.percentiles)
+        for suffix, value in gauges:
+            yield from settle_gauge(GaugeMetric('%s.%s' % (name, suffix),
+                                                value, tags=tags))
+
+
+def settle_gauge(metric):
+    """Yields the lines setting gauge metric, as daemons understand them.
+    """
+    if metric.delta:
+        if metric.value:
+            yield metric
+    elif metric.value < 0:
+        yield GaugeMetric(metric.name, 0, rate=metric.rate, tags=metric.tags)
+        yield GaugeMetric(metric.name, metric.value, rate=metric.rate,
+                          delta=True, tags=metric.tags)
+    else:
+        yield metric
+
+
+def series_key(metric):
+    return metric.name, metric.rate, normalize_tags(metric.tags)
+
+
+def normalize_tags(tags):
+    """Returns a hashable equivalent of tags.
+    """
+    if not tags:
+        return None
+    if tags.__class__ is TagSet:
+        return tags
+    if isinstance(tags, Mapping):
+        return frozenset('%s:%s' % item for item in tags.items())
+    if isinstance(tags, str):
+        return frozenset([tags])
+    return frozenset(tags)
@@ -6,6 +6,8 @@ class Check:
     __slots__ = ('name', 'status', 'timestamp', 'hostname', 'tags', 'message',
                  'value')
 
+    code = '_sc'
+
     def __init__(self, name, status, timestamp=None,
                  hostname=None, tags=None, message=None):
         self.name = name
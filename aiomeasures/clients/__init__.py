@@ -1,4 +1,9 @@
-from .datadog import Datadog
-from .statsd import StatsD
+from aiomeasures.util import lazy_attributes
 
-__all__ = ['Datadog', 'StatsD']
+__all__ = ['Datadog', 'Prometheus', 'StatsD']
+
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    'Datadog': '.datadog',
+    'Prometheus': '.prometheus',
+    'StatsD': '.statsd',
+}, globals())
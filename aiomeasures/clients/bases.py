@@ -1,44 +1,160 @@
 import asyncio
+import inspect
 from abc import ABCMeta, abstractmethod
 from aiomeasures.checks import Check
+from aiomeasures.clients.templates import series_tags
 from aiomeasures.events import Event
 from aiomeasures.metrics import CountingMetric, GaugeMetric
 from aiomeasures.metrics import HistogramMetric, SetMetric, TimingMetric
+from aiomeasures.metrics import Milliseconds
+from collections import OrderedDict
+from decimal import Decimal
+from functools import wraps
+from random import random
+from threading import get_ident
 from time import perf_counter
 
+try:
+    from time import perf_counter_ns
+except ImportError:
+    def perf_counter_ns():
+        return int(perf_counter() * 1000000000)
+
+try:
+    current_task = asyncio.current_task
+except AttributeError:
+    current_task = asyncio.Task.current_task
+
+
+def isasyncgenfunction(func):
+    # asynchronous generators exist since python 3.6
+    test = getattr(inspect, 'isasyncgenfunction', None)
+    return test is not None and test(func)
+
+
+#: flush latencies given by Client.stats
+LATENCY_PERCENTILES = [(0.5, 'p50'), (0.9, 'p90'), (0.99, 'p99'),
+                       (1, 'max')]
+
+#: rates which are sampling probabilities
+SAMPLING_RATES = frozenset([float, int, Decimal])
+
+
+def sampled_out(rate):
+    """Tells if a metric of this rate must be skipped.
+
+    Each call draws its own random number.
+    """
+    return rate.__class__ in SAMPLING_RATES and random() >= rate
+
 
 class Client(metaclass=ABCMeta):
+    """Sampled metrics (``rate`` < 1) are kept or skipped right away,
+    before any metric is built. Skipped ones return None.
+
+    The ``*_many`` methods record a sequence or a NumPy array of values
+    at once, each value being sampled on its own. They return None.
+    """
 
     def incr(self, name, value=None, rate=None, tags=None):
+        if rate is not None and sampled_out(rate):
+            self.sampled_out += 1
+            return None
         value = abs(value or 1)
         metric = CountingMetric(name, value, rate=rate, tags=tags)
         return self.register(metric)
 
     def decr(self, name, value=None, rate=None, tags=None):
+        if rate is not None and sampled_out(rate):
+            self.sampled_out += 1
+            return None
         value = -abs(value or 1)
         metric = CountingMetric(name, value, rate=rate, tags=tags)
         return self.register(metric)
 
     def counter(self, name, value, rate=None, tags=None):
+        if rate is not None and sampled_out(rate):
+            self.sampled_out += 1
+            return None
         metric = CountingMetric(name, value, rate=rate, tags=tags)
         return self.register(metric)
 
+    def sample(self, values, rate):
+        """Returns the values kept at this rate, as a list.
+
+        NumPy arrays, or anything with a ``tolist`` method, are converted
+        at once into Python numbers.
+        """
+        tolist = getattr(values, 'tolist', None)
+        values = tolist() if tolist is not None else list(values)
+        if rate is not None and rate.__class__ in SAMPLING_RATES:
+            kept = [value for value in values if random() < rate]
+            self.sampled_out += len(values) - len(kept)
+            values = kept
+        return values
+
+    def counter_many(self, name, values, rate=None, tags=None):
+        values = self.sample(values, rate)
+        if values:
+            # counters add up, so a single one counts them all
+            metric = CountingMetric(name, sum(values), rate=rate, tags=tags)
+            self.register(metric)
+
     def timing(self, name, value=None, rate=None, tags=None):
+        if rate is not None and sampled_out(rate):
+            self.sampled_out += 1
+            return None
         metric = TimingMetric(name, value, rate=rate, tags=tags)
         return self.register(metric)
 
-    def timer(self, name, rate=None, tags=None):
-        return Timer(client=self, name=name, rate=rate, tags=tags)
+    def timing_many(self, name, values, rate=None, tags=None):
+        values = self.sample(values, rate)
+        if values:
+            self.register_many(TimingMetric, name, values, rate, tags)
+
+    def counter_handle(self, name, tags=None):
+        """Returns the handle of a counter series.
+
+        Handles sum their increments in memory, and each send emits their
+        total as a single counter. The same handle is returned for the
+        same name and tags.
+
+        Without a background flusher, the first increment following a
+        send schedules the next one.
+        """
+        key = name, series_tags(tags)
+        handle = self.handles.get(key)
+        if handle is None:
+            handle = self.handles[key] = CounterHandle(name, tags)
+        return handle
+
+    def timer(self, name, rate=None, tags=None, precision=None):
+        return Timer(client=self, name=name, rate=rate, tags=tags,
+                     precision=precision)
 
     def gauge(self, name, value, rate=None, delta=False):
+        if rate is not None and sampled_out(rate):
+            self.sampled_out += 1
+            return None
         metric = GaugeMetric(name, value, rate=rate, delta=delta)
         return self.register(metric)
 
     def histogram(self, name, value, rate=None, delta=False):
+        if rate is not None and sampled_out(rate):
+            self.sampled_out += 1
+            return None
         metric = HistogramMetric(name, value, rate=rate, delta=delta)
         return self.register(metric)
 
+    def histogram_many(self, name, values, rate=None, tags=None):
+        values = self.sample(values, rate)
+        if values:
+            self.register_many(HistogramMetric, name, values, rate, tags)
+
     def set(self, name, value, rate=None, tags=None):
+        if rate is not None and sampled_out(rate):
+            self.sampled_out += 1
+            return None
         metric = SetMetric(name, value, rate=rate, tags=tags)
         return self.register(metric)
 
@@ -50,6 +166,53 @@ class Client(metaclass=ABCMeta):
         check = Check(name, status, **kwargs)
         return self.register(check)
 
+    def stats(self):
+        """Returns a snapshot of the counters of the pipeline.
+
+        Counters add up since the creation of the client, and flush
+        latencies are given in milliseconds.
+        """
+        collector, reporter = self.collector, self.reporter
+        aggregator, latencies = self.aggregator, self.latencies
+        limiter = self.limiter
+        stats = OrderedDict([
+            ('registered', self.registered),
+            ('sampled_out', self.sampled_out),
+            ('aggregated', 0 if aggregator is None else aggregator.absorbed),
+            ('dropped', self.dropped),
+            ('spilled', collector.spilled),
+            ('pending', len(collector)),
+            ('formatted', collector.formatted),
+            ('bytes_sent', reporter.bytes_sent),
+            ('packets_sent', reporter.packets_sent),
+            ('dropped_lines', reporter.dropped_lines),
+            ('dropped_packets', reporter.dropped_packets),
+            ('send_errors', reporter.send_errors),
+            ('connect_errors', reporter.connect_errors),
+            ('flushes', self.flushes),
+            ('empty_flushes', self.empty_flushes),
+            ('series_folded', 0 if limiter is None else limiter.folded),
+            ('series_rejected', 0 if limiter is None else limiter.rejected),
+        ])
+        for q, suffix in LATENCY_PERCENTILES:
+            stats['flush_latency.%s' % suffix] = latencies.quantile(q)
+        return stats
+
+    def report_stats(self):
+        """Yields the stats as metrics named after :attr:`telemetry`.
+
+        Counters are sent as the difference with the previous report,
+        pending metrics and latencies as gauges.
+        """
+        previous, self._reported = self._reported, self.stats()
+        for key, value in self._reported.items():
+            name = '%s.%s' % (self.telemetry, key)
+            if key == 'pending' or key.startswith('flush_latency.'):
+                if value is not None:
+                    yield GaugeMetric(name, value)
+            elif value != previous.get(key, 0):
+                yield CountingMetric(name, value - previous.get(key, 0))
+
     @abstractmethod
     def format(self, metric, prefix=None):
         raise NotImplementedError()
@@ -65,37 +228,197 @@ class Client(metaclass=ABCMeta):
     def register(self, metric):
         raise NotImplementedError()
 
+    def register_many(self, cls, name, values, rate=None, tags=None):
+        """Registers a metric of cls for every value.
+        """
+        for value in values:
+            self.register(cls(name, value, rate=rate, tags=tags))
+
+    @abstractmethod
+    def start(self):
+        """Launches the background sender, if any.
+        """
+        raise NotImplementedError()
+
+    @asyncio.coroutine
+    @abstractmethod
+    def aclose(self):
+        """Sends pending metrics and closes.
+        """
+        raise NotImplementedError()
+
     @abstractmethod
     def close(self):
         raise NotImplementedError()
 
 
+class CounterHandle:
+    """Counter bound to a series, as cheap as an integer addition.
+    """
+
+    __slots__ = ('name', 'tags', 'value', 'wakeup')
+
+    def __init__(self, name, tags=None, wakeup=None):
+        self.name = name
+        self.tags = tags
+        self.value = 0
+        # called by the first increment since the last collect
+        self.wakeup = wakeup
+
+    def __repr__(self):
+        return '<%s(name=%r, tags=%r, value=%r)>' % (
+            self.__class__.__name__, self.name, self.tags, self.value)
+
+    def incr(self, value=1):
+        if not self.value and self.wakeup is not None:
+            self.wakeup()
+        self.value += value
+
+    def decr(self, value=1):
+        if not self.value and self.wakeup is not None:
+            self.wakeup()
+        self.value -= value
+
+    def collect(self):
+        """Returns the counter accumulated since the last call, if any.
+        """
+        value, self.value = self.value, 0
+        if value:
+            return CountingMetric(self.name, value, tags=self.tags)
+
+
 class Timer:
+    """Times a block, a function or a coroutine.
+
+    It can be used as a context manager, ``async with`` included, or to
+    decorate functions, coroutine functions and asynchronous generators.
+    The decorated coroutines are timed until they return, asynchronous
+    generators until they are exhausted or closed.
 
-    def __init__(self, client, name, rate=None, tags=None):
+    Each call and each block has its own start time, so one timer can be
+    shared between concurrent tasks and threads, blocks of ``with`` being
+    kept apart per thread and blocks of ``async with`` per task. Only
+    :meth:`start` and :meth:`stop` handle a single measure at a time.
+
+    Durations are measured in nanoseconds and sent in milliseconds,
+    truncated to integers unless ``precision`` decimals are requested.
+    """
+
+    def __init__(self, client, name, rate=None, tags=None, precision=None):
         self.client = client
         self.name = name
         self.rate = rate
         self.tags = tags
+        self.precision = precision
+        # stacks of start times of nested blocks, per thread or task
+        self._starts = {}
 
     def __call__(self, func):
-        def wrapper(*args, **kwargs):
-            try:
-                self.start()
-                return func(*args, **kwargs)
-            finally:
-                self.stop()
+        if asyncio.iscoroutinefunction(func):
+            @asyncio.coroutine
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                started = perf_counter_ns()
+                try:
+                    return (yield from func(*args, **kwargs))
+                finally:
+                    self.record(started)
+        elif isasyncgenfunction(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                return TimedAsyncIterator(self, func(*args, **kwargs))
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                started = perf_counter_ns()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(started)
         return wrapper
 
     def __enter__(self):
-        self.start()
+        self.push(get_ident())
+        return self
 
     def __exit__(self, type, value, tb):
-        self.stop()
+        self.record(self.pop(get_ident()))
+
+    @asyncio.coroutine
+    def __aenter__(self):
+        self.push(current_task(loop=self.client.loop))
+        return self
+
+    @asyncio.coroutine
+    def __aexit__(self, type, value, tb):
+        self.record(self.pop(current_task(loop=self.client.loop)))
+
+    def push(self, key):
+        self._starts.setdefault(key, []).append(perf_counter_ns())
+
+    def pop(self, key):
+        starts = self._starts[key]
+        started = starts.pop()
+        if not starts:
+            del self._starts[key]
+        return started
 
     def start(self):
-        self._started = perf_counter()
+        self._started = perf_counter_ns()
 
     def stop(self):
-        value = int((perf_counter() - self._started) * 1000)
+        self.record(self._started)
+
+    def record(self, started):
+        """Sends the time elapsed since started.
+        """
+        elapsed = perf_counter_ns() - started
+        if self.precision is None:
+            value = elapsed // 1000000
+        else:
+            value = Milliseconds(elapsed / 1000000, self.precision)
         self.client.timing(self.name, value, rate=self.rate, tags=self.tags)
+
+
+class TimedAsyncIterator:
+    """Times an asynchronous iterator, from its first step to its end.
+    """
+
+    def __init__(self, timer, iterator):
+        self.timer = timer
+        self.iterator = iterator
+        self.started = None
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return self.step(self.iterator.__anext__())
+
+    def asend(self, value):
+        return self.step(self.iterator.asend(value))
+
+    def athrow(self, *args):
+        return self.step(self.iterator.athrow(*args))
+
+    @asyncio.coroutine
+    def step(self, awaitable):
+        if self.started is None:
+            self.started = perf_counter_ns()
+        try:
+            return (yield from awaitable.__await__())
+        except BaseException:
+            self.record()
+            raise
+
+    @asyncio.coroutine
+    def aclose(self):
+        try:
+            yield from self.iterator.aclose().__await__()
+        finally:
+            self.record()
+
+    def record(self):
+        started, self.started = self.started, False
+        if started:
+            self.timer.record(started)
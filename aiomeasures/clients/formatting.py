@@ -0,0 +1,257 @@
+"""
+    Lines of the StatsD protocol and of its dialects.
+
+    Metrics, events and checks carry a ``code``, which dialects look up
+    in their tables to know how, and whether, to format them.
+"""
+
+from aiomeasures.metrics import Milliseconds
+from aiomeasures.tags import TagSet
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+__all__ = ['Dialect', 'DOGSTATSD', 'STATSD', 'MANGLERS']
+
+
+class Dialect:
+    """What a stats daemon understands.
+
+    Parameters:
+        name (str): name of the dialect
+        types (dict): type in lines of each metric code, the codes
+                      missing being unsupported
+        formatters (dict): formatter of each other code, like events
+                           and checks, the codes missing being unsupported
+        tags (bool): whether lines accept tags
+        mangle (callable): folds tags into names, when lines do not
+                           accept them, or drops them if None
+    """
+
+    def __init__(self, name, types, formatters=None, *, tags=True,
+                 mangle=None):
+        self.name = name
+        self.types = types
+        self.formatters = formatters or {}
+        self.tags = tags
+        self.mangle = mangle
+
+    def __repr__(self):
+        return '<%s(%s)>' % (self.__class__.__name__, self.name)
+
+    def supports(self, obj):
+        """Tells whether objects of this class are sent at all.
+        """
+        return obj.code in self.types or obj.code in self.formatters
+
+    def mangled(self, mangle):
+        """Returns the same dialect, folding tags into names with mangle.
+
+        Parameters:
+            mangle (str, callable): a key of :data:`MANGLERS`, or a
+                                    function of the name and sorted tags
+        """
+        if isinstance(mangle, str):
+            try:
+                mangle = MANGLERS[mangle]
+            except KeyError:
+                raise ValueError('mangle must be one of %s'
+                                 % ', '.join(sorted(MANGLERS)))
+        return Dialect(self.name, self.types, self.formatters,
+                       tags=self.tags, mangle=mangle)
+
+    def format(self, obj, prefix=None, tags=None):
+        try:
+            code = obj.code
+        except AttributeError:
+            raise ValueError('Cannot consume %r' % obj)
+        if code in self.types:
+            head, tail = self.format_template(obj, prefix, tags)
+            return head + format_value(obj.value, obj.delta) + tail
+        formatter = self.formatters.get(code)
+        if formatter is None:
+            raise ValueError('%s cannot consume %r' % (self.name, obj))
+        return formatter(obj, prefix, tags)
+
+    def format_template(self, metric, prefix=None, tags=None):
+        """Returns what precedes and follows the value in the metric line.
+        """
+        name = format_name(metric.name, prefix)
+        suffix = ''
+        if metric.rate is not None:
+            suffix += '|%s' % format_rate(metric.rate)
+
+        if metric.tags or tags:
+            tags = format_tags(metric.tags, tags)
+            if self.tags:
+                suffix += '|#%s' % ','.join(tags)
+            elif self.mangle is not None:
+                name = self.mangle(name, tags)
+
+        return '%s:' % name, '|%s%s' % (self.types[metric.code], suffix)
+
+
+def format_check(check, prefix=None, tags=None):
+    response = '_sc|%s' % check.name
+    if check.status in (0, 'ok', 'OK'):
+        response += '|0'
+    if check.status in (1, 'warn', 'warning', 'WARNING'):
+        response += '|1'
+    if check.status in (2, 'crit', 'critical', 'CRITICAL'):
+        response += '|2'
+    if check.status in (3, 'unknown', 'UNKNOWN'):
+        response += '|3'
+
+    if check.timestamp:
+        response += '|d:%s' % format_timestamp(check.timestamp)
+    if check.hostname:
+        response += '|h:%s' % check.hostname
+    if check.tags or tags:
+        tags = format_tags(check.tags, tags)
+        response += '|#%s' % ','.join(tags)
+    if check.message:
+        response += '|m:%s' % check.message
+    return response
+
+
+def format_event(event, prefix=None, tags=None):
+    a, b = len(event.title), len(event.text)
+    response = '_e{%s,%s}%s|%s' % (a, b, event.title, event.text)
+    if event.date_happened:
+        response += '|d:%s' % format_timestamp(event.date_happened)
+    if event.hostname:
+        response += '|h:%s' % event.hostname
+    if event.aggregation_key:
+        response += '|k:%s' % event.aggregation_key
+    if event.priority:
+        response += '|p:%s' % event.priority
+    if event.source_type_name:
+        response += '|s:%s' % event.source_type_name
+    if event.alert_type:
+        response += '|t:%s' % event.alert_type
+
+    if event.tags or tags:
+        tags = format_tags(event.tags, tags)
+        response += '|#%s' % ','.join(tags)
+    return response
+
+
+def format_rate(obj):
+    if isinstance(obj, (float, int, Decimal)):
+        return '@%s' % obj
+    if isinstance(obj, timedelta):
+        interval = float(obj.seconds)
+        if obj.microseconds:
+            interval += obj.microseconds / 1000000
+
+        if obj.days:
+            interval += obj.days * 24 * 3600
+        data = '@%.3f' % interval
+        data = data.rstrip('0')
+        data = data.rstrip('.')
+        return data
+
+
+def format_tags(obj, defaults=None):
+    if obj.__class__ is TagSet:
+        # sorted once for all
+        return obj.merge(defaults).sorted
+    result = set()
+    for src in (obj, defaults):
+        if isinstance(src, TagSet):
+            result.update(src)
+        elif isinstance(src, Mapping):
+            result.update(['%s:%s' % (k, v) for k, v in src.items()])
+        elif isinstance(src, list):
+            result.update(src)
+        elif isinstance(src, str):
+            result.add(src)
+    return sorted(result)
+
+
+def format_name(name, prefix=None):
+    if prefix:
+        return '%s.%s' % (prefix, name)
+    return '%s' % name
+
+
+def format_value(value, delta=None):
+    if value is None:
+        raise ValueError('Cannot format a metric without value')
+    if delta and value > 0:
+        return '+%s' % value
+    if value.__class__ is Milliseconds:
+        # fixed decimals are cheaper than the shortest repr of floats
+        return value.template % value
+    return '%s' % value
+
+
+def format_timestamp(value):
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    if isinstance(value, float):
+        return int(value)
+    return value
+
+
+def mangle_graphite(name, tags):
+    """Returns name followed by tags, like ``name;key=value``.
+
+    Tags without value are set to ``true``.
+    """
+    parts = [name]
+    for tag in tags:
+        key, _, value = tag.partition(':')
+        parts.append('%s=%s' % (sanitize(key, ' ;!^='),
+                                sanitize(value, ' ;') or 'true'))
+    return ';'.join(parts)
+
+
+def mangle_dotted(name, tags):
+    """Returns name followed by tags, like ``name.key.value``.
+    """
+    parts = [name]
+    for tag in tags:
+        key, _, value = tag.partition(':')
+        parts.append(sanitize(key, ' .'))
+        if value:
+            parts.append(sanitize(value, ' .'))
+    return '.'.join(parts)
+
+
+def sanitize(text, chars):
+    for char in chars:
+        if char in text:
+            text = text.replace(char, '_')
+    return text
+
+
+#: ways to fold tags into names
+MANGLERS = {
+    'graphite': mangle_graphite,
+    'dotted': mangle_dotted,
+    'drop': None,
+}
+
+#: the dialect of the Datadog agent, with tags, histograms, events
+#: and service checks
+DOGSTATSD = Dialect('DogStatsD', {
+    'c': 'c',
+    'g': 'g',
+    'h': 'h',
+    's': 's',
+    'ms': 'ms',
+}, {
+    '_e': format_event,
+    '_sc': format_check,
+})
+
+#: the dialect of plain StatsD daemons, where histograms are timers and
+#: tags are folded into names, Graphite style
+STATSD = Dialect('StatsD', {
+    'c': 'c',
+    'g': 'g',
+    'h': 'ms',
+    's': 's',
+    'ms': 'ms',
+}, tags=False, mangle=mangle_graphite)
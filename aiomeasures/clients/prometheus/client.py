@@ -0,0 +1,250 @@
+import asyncio
+import logging
+from . import formatting
+from .registry import CounterSeries, GaugeSeries, HistogramSeries
+from .registry import DEFAULT_BUCKETS, Registry
+from aiomeasures import forks
+from aiomeasures.clients.bases import LATENCY_PERCENTILES, Client
+from aiomeasures.clients.bases import SAMPLING_RATES
+from aiomeasures.collectors import Inbox
+from aiomeasures.metrics import CountingMetric, GaugeMetric
+from aiomeasures.metrics import HistogramMetric, TimingMetric
+from aiomeasures.sketches import Sketch
+from aiomeasures.util import parse_addr
+from collections import OrderedDict
+from threading import get_ident
+from time import perf_counter
+
+__all__ = ['Prometheus']
+
+#: series updated by metrics, by class of metric
+SERIES = {
+    CountingMetric: CounterSeries,
+    GaugeMetric: GaugeSeries,
+    HistogramMetric: HistogramSeries,
+    TimingMetric: HistogramSeries,
+}
+
+
+class Prometheus(Client):
+
+    def __init__(self, addr=':9102', *, prefix=None, tags=None, loop=None,
+                 buckets=DEFAULT_BUCKETS):
+        """Serves statistics over HTTP, for Prometheus to scrape them
+
+        Metrics are not sent: they update series kept in memory, which
+        :meth:`start` serves at ``/metrics`` in the OpenMetrics format.
+        Counters add up, gauges keep their last value, and histograms and
+        timings count their values into ``buckets``. Sampled counters,
+        histograms and timings count ``1 / rate`` times. Sets, events and
+        service checks have no equivalent and are ignored, and so are
+        negative increments of counters, which only go up.
+
+        Metrics registered by other threads are buffered in an
+        :class:`~aiomeasures.collectors.Inbox`, which the loop drains
+        before each scrape and once woken up, and alone updates the
+        series. The loop thread is the one creating the client, or the
+        last one calling :meth:`start`.
+
+        Tags become labels, ``key:value`` tags giving a label ``key``
+        and other tags a label set to ``true``.
+
+        Parameters:
+            addr (str): the address in the form http://host:port
+            loop (EventLoop): the event loop
+            prefix (str): prefix for all names
+            tags (dict): default labels for everything
+            buckets (tuple): upper bounds of histogram buckets
+        """
+        if isinstance(addr, str) and addr.startswith('http://'):
+            addr = addr[7:]
+        self.addr = parse_addr(addr, proto='http')
+        self.loop = loop or asyncio.get_event_loop()
+        self.log = logging.getLogger(__name__)
+        self.prefix = prefix
+        self.tags = tags
+        self.registry = Registry(prefix=prefix, tags=tags, buckets=buckets)
+        self.server = None
+        self.handles = {}
+        self.inbox = Inbox()
+        self._thread = get_ident()
+        self.registered = 0
+        self.sampled_out = 0
+        self.ignored = 0
+        self.scrapes = 0
+        self.latencies = Sketch()
+        forks.track(self)
+
+    def register(self, metric):
+        if get_ident() != self._thread:
+            return self.register_threadsafe(metric)
+        forks.check()
+        self.registered += 1
+        cls = SERIES.get(metric.__class__)
+        value = getattr(metric, 'value', None)
+        series = None
+        if cls is not None and value is not None:
+            if cls is not CounterSeries or value >= 0:
+                series = self.registry.series(cls, metric.name, metric.tags)
+        if series is None:
+            self.ignored += 1
+        elif cls is GaugeSeries:
+            if metric.delta:
+                series.add(value)
+            else:
+                series.set(value)
+        elif metric.rate.__class__ in SAMPLING_RATES:
+            # sampled metrics stand for more occurrences
+            series.add(value, 1 / metric.rate)
+        else:
+            series.add(value)
+        return metric
+
+    def register_threadsafe(self, metric):
+        if self.inbox.append(metric) and self.inbox.notify():
+            self.loop.call_soon_threadsafe(self.collect_inbox)
+        return metric
+
+    def collect_inbox(self):
+        for metric in self.inbox.drain():
+            self.register(metric)
+
+    def format(self, obj):
+        """Returns the exposition of obj, as if it were alone.
+        """
+        registry = Registry(prefix=self.prefix, tags=self.tags,
+                            buckets=self.registry.buckets)
+        registry, self.registry = self.registry, registry
+        try:
+            self.register(obj)
+            return self.registry.render().decode('utf-8')
+        finally:
+            self.registry = registry
+
+    def render(self):
+        """Returns the exposition of every series, as bytes.
+        """
+        forks.check()
+        started = perf_counter()
+        if self.inbox:
+            self.collect_inbox()
+        for handle in self.handles.values():
+            metric = handle.collect()
+            if metric is not None:
+                self.register(metric)
+        body = self.registry.render()
+        self.scrapes += 1
+        self.latencies.add((perf_counter() - started) * 1000)
+        return body
+
+    def stats(self):
+        stats = OrderedDict([
+            ('registered', self.registered),
+            ('sampled_out', self.sampled_out),
+            ('ignored', self.ignored),
+            ('conflicts', self.registry.conflicts),
+            ('series', len(self.registry)),
+            ('scrapes', self.scrapes),
+        ])
+        for q, suffix in LATENCY_PERCENTILES:
+            stats['render_latency.%s' % suffix] = self.latencies.quantile(q)
+        return stats
+
+    def start(self):
+        """Starts serving scrapes.
+        """
+        self._thread = get_ident()
+        if self.server is None:
+            self.server = asyncio.Task(self.serve(), loop=self.loop)
+
+    @asyncio.coroutine
+    def serve(self):
+        server = yield from self.loop.create_server(
+            lambda: ScrapeProtocol(self),
+            host=self.addr.host or None,
+            port=self.addr.port)
+        self.log.info('serve metrics on port %s',
+                      server.sockets[0].getsockname()[1])
+        return server
+
+    @property
+    def port(self):
+        """Port really listened, once started.
+        """
+        if self.server is not None and self.server.done():
+            return self.server.result().sockets[0].getsockname()[1]
+
+    @asyncio.coroutine
+    def send(self):
+        """Series are only sent when scraped.
+        """
+
+    @asyncio.coroutine
+    def aclose(self):
+        """Stops serving scrapes.
+        """
+        task, self.server = self.server, None
+        if task is not None:
+            server = yield from task
+            server.close()
+            yield from server.wait_closed()
+
+    def close(self):
+        task, self.server = self.server, None
+        if task is not None:
+            if task.done():
+                task.result().close()
+            else:
+                task.cancel()
+
+    def reset(self):
+        """Forgets the server and the series inherited from a parent.
+        """
+        self.server = None
+        self._thread = get_ident()
+        self.inbox = Inbox()
+        self.registry.clear()
+        for handle in self.handles.values():
+            handle.value = 0
+
+
+class ScrapeProtocol(asyncio.Protocol):
+    """Answers to HTTP requests of ``/metrics``, one per connection.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.transport = None
+        self.buffer = b''
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.buffer += data
+        if b'\r\n\r\n' not in self.buffer and b'\n\n' not in self.buffer:
+            if len(self.buffer) > 16384:
+                self.respond(b'431 Request Header Fields Too Large')
+            return
+        try:
+            method, path, _ = self.buffer.split(b'\n', 1)[0].split(b' ', 2)
+        except ValueError:
+            return self.respond(b'400 Bad Request')
+        if method not in (b'GET', b'HEAD'):
+            return self.respond(b'405 Method Not Allowed')
+        if path.split(b'?', 1)[0] != b'/metrics':
+            return self.respond(b'404 Not Found')
+        body = self.client.render()
+        self.respond(b'200 OK', body, formatting.CONTENT_TYPE,
+                     head=method == b'HEAD')
+
+    def respond(self, status, body=b'', content_type='text/plain', *,
+                head=False):
+        headers = ('Content-Type: %s\r\n'
+                   'Content-Length: %d\r\n'
+                   'Connection: close\r\n\r\n') % (content_type, len(body))
+        self.transport.write(b'HTTP/1.1 ' + status + b'\r\n'
+                             + headers.encode('latin-1'))
+        if not head:
+            self.transport.write(body)
+        self.transport.close()
@@ -0,0 +1,75 @@
+"""
+    Encodes series into the OpenMetrics text format, which Prometheus
+    scrapes.
+"""
+
+import re
+from aiomeasures.tags import normalize
+from math import isinf, isnan
+
+#: content type of the exposition
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+INVALID_NAME = re.compile(r'[^a-zA-Z0-9_:]')
+INVALID_LABEL = re.compile(r'[^a-zA-Z0-9_]')
+
+
+def format_name(name, prefix=None):
+    if prefix:
+        name = '%s.%s' % (prefix, name)
+    name = INVALID_NAME.sub('_', name)
+    if name[:1].isdigit():
+        name = '_' + name
+    return name
+
+
+def format_labels(tags, defaults=None):
+    """Returns the labels of tags, like ``{route="index"}``.
+
+    ``key:value`` tags give a label ``key``, other tags a label named
+    after them with the value ``true``.
+    """
+    labels = {}
+    for src in (defaults, tags):
+        for tag in normalize(src):
+            key, sep, value = tag.partition(':')
+            if not sep:
+                value = 'true'
+            key = INVALID_LABEL.sub('_', key)
+            if key[:1].isdigit():
+                key = '_' + key
+            labels[key] = value
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (key, escape(labels[key]))
+                             for key in sorted(labels))
+
+
+def format_value(value):
+    if value.__class__ is int:
+        return '%d' % value
+    value = float(value)
+    if isnan(value):
+        return 'NaN'
+    if isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+def format_header(name, kind):
+    return ('# TYPE %s %s\n' % (name, kind)).encode('utf-8')
+
+
+def add_label(labels, key, value):
+    """Appends a label to formatted labels.
+    """
+    label = '%s="%s"' % (key, value)
+    if not labels:
+        return '{%s}' % label
+    return '%s,%s}' % (labels[:-1], label)
+
+
+def escape(value):
+    return (str(value).replace('\\', '\\\\')
+                      .replace('"', '\\"')
+                      .replace('\n', '\\n'))
@@ -0,0 +1,162 @@
+from . import formatting
+from aiomeasures.aggregators import normalize_tags
+from bisect import bisect_left
+
+#: upper bounds of histogram buckets, in milliseconds for timings
+DEFAULT_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Registry:
+    """Cumulative state of every series, rendered for scrapes.
+
+    Each series keeps its lines encoded, and only the series updated
+    since the previous scrape are encoded again.
+
+    Families are identified by their name in the exposition, so names
+    only differing by characters Prometheus does not accept share the
+    same family.
+    """
+
+    def __init__(self, *, prefix=None, tags=None, buckets=DEFAULT_BUCKETS):
+        """
+        Parameters:
+            prefix (str): prefix of all names
+            tags (dict): labels of all series
+            buckets (tuple): upper bounds of histogram buckets
+        """
+        self.prefix = prefix
+        self.tags = tags
+        self.buckets = tuple(sorted(buckets))
+        self.families = {}
+        self.names = {}
+        self.conflicts = 0
+
+    def __len__(self):
+        return sum(len(family.series) for family in self.families.values())
+
+    def clear(self):
+        self.families.clear()
+        self.names.clear()
+
+    def series(self, cls, name, tags):
+        """Returns the series of name and tags, created if needed.
+
+        Returns:
+            Series: the series, or None if name has another type
+        """
+        exposed = self.names.get(name)
+        if exposed is None:
+            exposed = self.names[name] = formatting.format_name(name,
+                                                                self.prefix)
+        family = self.families.get(exposed)
+        if family is None:
+            family = self.families[exposed] = Family(exposed, cls)
+        elif family.cls is not cls:
+            self.conflicts += 1
+            return None
+        key = normalize_tags(tags)
+        series = family.series.get(key)
+        if series is None:
+            labels = formatting.format_labels(tags, self.tags)
+            series = family.series[key] = cls(family.name, labels,
+                                              self.buckets)
+        return series
+
+    def render(self):
+        """Returns the whole exposition, as bytes.
+        """
+        chunks = []
+        append = chunks.append
+        for family in self.families.values():
+            append(family.header)
+            for series in family.series.values():
+                chunk = series.chunk
+                if chunk is None:
+                    chunk = series.chunk = series.render()
+                append(chunk)
+        append(b'# EOF\n')
+        return b''.join(chunks)
+
+
+class Family:
+
+    __slots__ = ('name', 'cls', 'header', 'series')
+
+    def __init__(self, name, cls):
+        self.name = name
+        self.cls = cls
+        self.header = formatting.format_header(name, cls.kind)
+        self.series = {}
+
+
+class CounterSeries:
+
+    __slots__ = ('head', 'value', 'chunk')
+
+    kind = 'counter'
+
+    def __init__(self, name, labels, buckets=None):
+        self.head = '%s_total%s ' % (name, labels)
+        self.value = 0
+        self.chunk = None
+
+    def add(self, value, count=1):
+        self.value += value * count
+        self.chunk = None
+
+    def render(self):
+        line = self.head + formatting.format_value(self.value) + '\n'
+        return line.encode('utf-8')
+
+
+class GaugeSeries(CounterSeries):
+
+    __slots__ = ()
+
+    kind = 'gauge'
+
+    def __init__(self, name, labels, buckets=None):
+        self.head = '%s%s ' % (name, labels)
+        self.value = 0
+        self.chunk = None
+
+    def set(self, value):
+        self.value = value
+        self.chunk = None
+
+
+class HistogramSeries:
+
+    __slots__ = ('heads', 'bounds', 'counts', 'count', 'sum', 'chunk')
+
+    kind = 'histogram'
+
+    def __init__(self, name, labels, buckets):
+        add_label = formatting.add_label
+        bounds = [formatting.format_value(float(bound)) for bound in buckets]
+        self.heads = [
+            '%s_bucket%s ' % (name, add_label(labels, 'le', bound))
+            for bound in bounds + ['+Inf']
+        ] + ['%s_count%s ' % (name, labels), '%s_sum%s ' % (name, labels)]
+        self.bounds = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+        self.chunk = None
+
+    def add(self, value, count=1):
+        self.counts[bisect_left(self.bounds, value)] += count
+        self.count += count
+        self.sum += value * count
+        self.chunk = None
+
+    def render(self):
+        format_value = formatting.format_value
+        lines, total = [], 0
+        for head, count in zip(self.heads, self.counts):
+            total += count
+            # sampled values give fractional counts
+            lines.append('%s%d\n' % (head, round(total)))
+        lines.append('%s%d\n' % (self.heads[-2], round(self.count)))
+        lines.append('%s%s\n' % (self.heads[-1], format_value(self.sum)))
+        return ''.join(lines).encode('utf-8')
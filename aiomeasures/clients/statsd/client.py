@@ -1,48 +1,326 @@
 import asyncio
 import logging
-from . import formatting
+from aiomeasures import forks
 from aiomeasures.clients.bases import Client
-from aiomeasures.collectors import Collector
+from aiomeasures.checks import Check
+from aiomeasures.clients.formatting import STATSD
+from aiomeasures.clients.templates import Templates
+from aiomeasures.collectors import Collector, Inbox, DROP_OLDEST, SPILL
+from aiomeasures.events import Event
+from aiomeasures.flushers import Flusher
 from aiomeasures.reporters import StatsDReporter
-from random import random
+from aiomeasures.sketches import Sketch
+from aiomeasures.tags import TagSet
+from threading import get_ident
+from time import perf_counter
+
+__all__ = ['StatsD']
 
 
 class StatsD(Client):
 
-    def __init__(self, addr, *, prefix=None, tags=None, loop=None):
+    #: what the stats daemon understands
+    dialect = STATSD
+
+    def __init__(self, addr, *, prefix=None, tags=None, loop=None,
+                 flush_interval=None, flush_size=500, aggregator=None,
+                 max_packet_size=None, capacity=5000, overflow=DROP_OLDEST,
+                 cache_size=1024, telemetry=None, telemetry_interval=10,
+                 limiter=None, mangle=None):
         """Sends statistics to the stats daemon over UDP
 
+        Lines are written in the plain StatsD dialect: histograms are
+        sent as timers, events and service checks are not sent at all,
+        and tags are folded into names by ``mangle``, ``graphite`` giving
+        ``name;key=value``, ``dotted`` giving ``name.key.value`` and
+        ``drop`` dropping them. Use :class:`Datadog` for DogStatsD.
+
+        By default every registered metric schedules its own send.
+        When ``flush_interval`` is set, metrics are only queued and a single
+        background task, launched by :meth:`start`, sends them every
+        ``flush_interval`` seconds or as soon as ``flush_size`` metrics
+        are pending.
+
+        An ``aggregator`` merges metrics of the same series until the next
+        send, which is best combined with ``flush_interval``.
+
+        A ``limiter`` bounds the number of series, moving metrics of new
+        series to an overflow series or rejecting them, in which case
+        register returns None.
+
+        At most ``capacity`` metrics wait for the next send, ``overflow``
+        deciding what happens to the others (see :class:`Collector`).
+        Async producers using the ``block`` policy should
+        ``yield from client.drain()`` to wait for room.
+
+        Metrics can be registered from other threads, like executor
+        workers. They are buffered per thread, and the loop is only woken
+        up by the first metric of a batch, or once ``flush_size`` metrics
+        are buffered with ``flush_interval``. The loop thread is the one
+        creating the client, or the last one calling :meth:`start`.
+
+        The counters of :meth:`stats` are sent every ``telemetry_interval``
+        seconds as metrics named ``<telemetry>.<counter>``, when
+        ``telemetry`` is set.
+
+        The formatted parts of the ``cache_size`` most recent series are
+        cached, and dropped whenever :attr:`prefix` or :attr:`tags`
+        are set.
+
         Parameters:
-            addr (str): the address in the form udp://host:port
+            addr (str): the address in the form udp://host:port,
+                        tcp://host:port or unix:///path/to/socket
             loop (EventLoop): the event loop
             prefix (str): prefix for all keys
-            tags (dict): default tags for everything
+            tags (dict): default tags for everything, also a TagSet
+            flush_interval (float): delay between two sends, in seconds
+            flush_size (int): number of pending metrics forcing a send
+            aggregator (Aggregator): merges metrics before sending
+            limiter (CardinalityLimiter): bounds the number of series
+            max_packet_size (int): maximum payload of a datagram
+            capacity (int): maximum number of pending metrics
+            overflow (str): ``drop_oldest``, ``drop_newest``, ``block``
+                            or ``spill`` to the aggregator
+            cache_size (int): number of series with cached formatting
+            telemetry (str): prefix of the stats of the client
+            telemetry_interval (float): delay between two reports of stats
+            mangle (str): folds tags into names, for daemons without tags
         """
         self.loop = loop or asyncio.get_event_loop()
         self.log = logging.getLogger(__name__)
+        if mangle is not None:
+            self.dialect = self.dialect.mangled(mangle)
+        self.templates = Templates(self.dialect, cache_size)
         self.prefix = prefix
         self.tags = tags
-        self.collector = Collector([], 5000)
-        self.reporter = StatsDReporter(addr, loop=self.loop)
+        self.collector = Collector(
+            [], capacity,
+            overflow=overflow,
+            spill=aggregator.add if aggregator is not None else None,
+            loop=self.loop)
+        self.inbox = Inbox(capacity)
+        self.reporter = StatsDReporter(addr, loop=self.loop,
+                                       max_packet_size=max_packet_size)
+        self.aggregator = aggregator
+        self.limiter = limiter
+        self._aggregate = None
+        if aggregator is not None and overflow != SPILL:
+            # otherwise the aggregator only absorbs the overflow
+            self._aggregate = aggregator.add
+        self.handles = {}
+        self.flush_size = flush_size
+        self.flusher = None
+        self._thread = get_ident()
+        self.registered = 0
+        self.sampled_out = 0
+        self.flushes = 0
+        self.empty_flushes = 0
+        self.latencies = Sketch()
+        self.telemetry = telemetry
+        self.telemetry_interval = telemetry_interval
+        self._telemetry_at = self.loop.time() + telemetry_interval
+        self._reported = {}
+        if flush_interval is not None:
+            self.flusher = Flusher(self.send, flush_interval, loop=self.loop)
+        forks.track(self)
+
+    @property
+    def prefix(self):
+        return self._prefix
+
+    @prefix.setter
+    def prefix(self, value):
+        self._prefix = value
+        self.templates.clear()
+
+    @property
+    def tags(self):
+        return self._tags_value
+
+    @tags.setter
+    def tags(self, value):
+        self._tags_value = value
+        # merged once into the tags of each series
+        self._tags = TagSet(value) if value else None
+        self.templates.clear()
 
     def register(self, metric):
-        self.collector.append(metric)
+        if get_ident() != self._thread:
+            return self.register_threadsafe(metric)
+        forks.check()
+        self.registered += 1
+        if self.limiter is not None:
+            metric = self.limiter.limit(metric)
+            if metric is None:
+                return None
+        if self._aggregate is None or not self._aggregate(metric):
+            self.collector.append(metric)
+        if self.flusher is None:
+            asyncio.Task(self.send(), loop=self.loop)
+        elif len(self.collector) >= self.flush_size:
+            self.flusher.wakeup()
+        return metric
+
+    def register_many(self, cls, name, values, rate=None, tags=None):
+        """Registers values at once, without building their metrics.
+
+        Values are either summarized by the aggregator, or formatted
+        together into a single item of the collector.
+        """
+        if get_ident() != self._thread:
+            return super().register_many(cls, name, values, rate, tags)
+        forks.check()
+        self.registered += len(values)
+        if self.limiter is not None:
+            metric = self.limiter.limit(cls(name, None, rate=rate, tags=tags))
+            if metric is None:
+                return
+            tags = metric.tags
+        aggregator = self.aggregator
+        if (self._aggregate is None
+                or not aggregator.add_samples(cls, name, values, rate, tags)):
+            lines = self.templates.format_many(cls, name, values, rate,
+                                               self._prefix, tags, self._tags)
+            self.collector.append(lines)
+        if self.flusher is None:
+            asyncio.Task(self.send(), loop=self.loop)
+        elif len(self.collector) >= self.flush_size:
+            self.flusher.wakeup()
+
+    def event(self, title, text, **kwargs):
+        if not self.dialect.supports(Event):
+            return None
+        return super().event(title, text, **kwargs)
+
+    def check(self, name, status, **kwargs):
+        if not self.dialect.supports(Check):
+            return None
+        return super().check(name, status, **kwargs)
+
+    def counter_handle(self, name, tags=None):
+        handle = super().counter_handle(name, tags)
+        if self.flusher is None:
+            handle.wakeup = self.schedule_send
+        return handle
+
+    def schedule_send(self):
         asyncio.Task(self.send(), loop=self.loop)
-        # self.loop.async(self.send())
+
+    def register_threadsafe(self, metric):
+        size = self.inbox.append(metric)
+        if not size:
+            return metric
+        if self.flusher is None:
+            if self.inbox.notify():
+                self.loop.call_soon_threadsafe(self.receive)
+        elif size == self.flush_size:
+            self.loop.call_soon_threadsafe(self.flusher.wakeup)
         return metric
 
+    def receive(self):
+        """Takes the metrics registered by other threads, and sends them.
+        """
+        self.collect_inbox()
+        if self.flusher is None:
+            asyncio.Task(self.send(), loop=self.loop)
+        elif len(self.collector) >= self.flush_size:
+            self.flusher.wakeup()
+
+    def collect_inbox(self):
+        aggregate, append = self._aggregate, self.collector.append
+        limiter = self.limiter
+        metrics = self.inbox.drain()
+        self.registered += len(metrics)
+        for metric in metrics:
+            if limiter is not None:
+                metric = limiter.limit(metric)
+                if metric is None:
+                    continue
+            if aggregate is None or not aggregate(metric):
+                append(metric)
+
+    @property
+    def dropped(self):
+        """Number of metrics lost because of overflow.
+        """
+        return self.collector.dropped + self.inbox.dropped
+
+    @asyncio.coroutine
+    def drain(self):
+        """Waits until the collector has room for another metric.
+        """
+        if self.collector.full():
+            if self.flusher is not None:
+                self.flusher.wakeup()
+            yield from self.collector.wait()
+
+    def start(self):
+        self._thread = get_ident()
+        if self.flusher is not None:
+            self.flusher.start()
+
     def format(self, obj):
-        return formatting.format(obj, self.prefix, self.tags)
+        return self.templates.format(obj, self._prefix, self._tags)
+
+    def encode(self, obj):
+        return self.templates.encode(obj, self._prefix, self._tags)
 
     @asyncio.coroutine
     def send(self):
-        """Sends key/value pairs to StatsD Server.
+        """Sends key/value pairs to the stats daemon.
         """
+        forks.check()
+        if self.inbox:
+            self.collect_inbox()
+        for handle in self.handles.values():
+            metric = handle.collect()
+            if metric is not None and self.limiter is not None:
+                metric = self.limiter.limit(metric)
+            if metric is not None:
+                self.collector.append(metric)
+        if self.aggregator is not None:
+            self.collector.extend(self.aggregator.flush())
+        if self.telemetry and self.loop.time() >= self._telemetry_at:
+            self._telemetry_at = self.loop.time() + self.telemetry_interval
+            self.collector.extend(self.report_stats())
+        self.flushes += 1
+        if not self.collector:
+            self.empty_flushes += 1
+            return
+        started = perf_counter()
         yield from self.reporter.connect()
-        rate = random()
-        formatter = self.format
-        metrics = self.collector.flush(rate=rate, formatter=formatter)
+        metrics = self.collector.flush(formatter=self.encode)
         yield from self.reporter.send(metrics)
+        self.latencies.add((perf_counter() - started) * 1000)
+
+    @asyncio.coroutine
+    def aclose(self):
+        """Stops the background task, sends what is left and closes.
+        """
+        if self.flusher is not None:
+            yield from self.flusher.close()
+        yield from self.send()
+        self.close()
 
     def close(self):
         self.reporter.close()
+
+    def reset(self):
+        """Forgets the connection, the task and the pending metrics.
+
+        Called in forked processes, which must call :meth:`start` again.
+        """
+        self.collector.reset()
+        self.inbox = Inbox(self.inbox.maxlen)
+        self._thread = get_ident()
+        self.registered = self.sampled_out = 0
+        self.flushes = self.empty_flushes = 0
+        self.latencies = Sketch()
+        self._reported = {}
+        if self.aggregator is not None:
+            self.aggregator.clear()
+        for handle in self.handles.values():
+            handle.value = 0
+        if self.flusher is not None:
+            self.flusher.reset()
+        self.reporter.reset()
@@ -0,0 +1,106 @@
+from aiomeasures.clients.formatting import format_value
+from collections import OrderedDict
+from collections.abc import Mapping
+
+
+class Templates:
+    """Caches the formatted parts of series around their value.
+
+    A series is identified by the code, name, rate and tags of metrics.
+    Only the ``maxsize`` most recently used series are kept, and the
+    cache must be cleared when the prefix or the default tags change.
+
+    Parts are kept both as text, for :meth:`format`, and as bytes, the
+    newline included, for :meth:`encode`.
+    """
+
+    def __init__(self, dialect, maxsize=1024):
+        """
+        Parameters:
+            dialect (Dialect): formats the lines
+            maxsize (int): maximum number of cached series
+        """
+        self.dialect = dialect
+        self.types = dialect.types
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.cache)
+
+    def clear(self):
+        self.cache.clear()
+
+    def format(self, obj, prefix=None, tags=None):
+        try:
+            key = (obj.code, obj.name, obj.rate, series_tags(obj.tags))
+            head, tail, _, _ = self.cache[key]
+        except KeyError:
+            if key[0] not in self.types:
+                return self.dialect.format(obj, prefix, tags)
+            head, tail, _, _ = self.add(key, obj, prefix, tags)
+        except (AttributeError, TypeError):
+            # events, service checks and unhashable tags
+            return self.dialect.format(obj, prefix, tags)
+        else:
+            self.cache.move_to_end(key)
+        value = format_value(obj.value, obj.delta)
+        return head + value + tail
+
+    def encode(self, obj, prefix=None, tags=None):
+        """Returns the line of obj as bytes, split around its value.
+
+        Returns:
+            tuple: what precedes the value, the value and what follows,
+                   or the line as text for events and service checks
+        """
+        try:
+            key = (obj.code, obj.name, obj.rate, series_tags(obj.tags))
+            _, _, head, tail = self.cache[key]
+        except KeyError:
+            if key[0] not in self.types:
+                return self.dialect.format(obj, prefix, tags)
+            _, _, head, tail = self.add(key, obj, prefix, tags)
+        except (AttributeError, TypeError):
+            # events, service checks and unhashable tags
+            return self.dialect.format(obj, prefix, tags)
+        else:
+            self.cache.move_to_end(key)
+        value = obj.value
+        if value.__class__ is int and not obj.delta:
+            return head, ('%d' % value).encode('ascii'), tail
+        value = format_value(value, obj.delta)
+        return head, value.encode('utf-8'), tail
+
+    def add(self, key, obj, prefix=None, tags=None):
+        head, tail = self.dialect.format_template(obj, prefix, tags)
+        parts = self.cache[key] = (head, tail, head.encode('utf-8'),
+                                   (tail + '\n').encode('utf-8'))
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+        return parts
+
+    def format_many(self, cls, name, values, rate=None, prefix=None,
+                    tags=None, default_tags=None):
+        """Returns the lines of values, joined by newlines.
+        """
+        metric = cls(name, None, rate=rate, tags=tags)
+        try:
+            key = (cls.code, name, rate, series_tags(tags))
+            head, tail, _, _ = self.cache[key]
+        except KeyError:
+            head, tail, _, _ = self.add(key, metric, prefix, default_tags)
+        except TypeError:
+            head, tail = self.dialect.format_template(metric, prefix,
+                                                      default_tags)
+        else:
+            self.cache.move_to_end(key)
+        return head + (tail + '\n' + head).join(map(str, values)) + tail
+
+
+def series_tags(tags):
+    if tags.__class__ is dict or isinstance(tags, Mapping):
+        return frozenset(tags.items())
+    if isinstance(tags, list):
+        return tuple(tags)
+    return tags
@@ -1,28 +1,190 @@
+import asyncio
+import threading
 from collections import deque
-from aiomeasures.events import Event
+
+#: Overflow policies of Collector
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+BLOCK = 'block'
+SPILL = 'spill'
 
 
 class Collector(deque):
     """Caped list of metrics
+
+    Once ``maxlen`` metrics are pending, ``overflow`` decides what happens:
+
+    * ``drop_oldest`` evicts the oldest metric
+    * ``drop_newest`` rejects the new metric
+    * ``block`` accepts it, async producers being expected to wait for
+      room with :meth:`wait`
+    * ``spill`` hands it to ``spill``, usually an aggregator, and rejects
+      it when ``spill`` returns False
+
+    Every metric lost is counted in :attr:`dropped`, and every line
+    yielded by :meth:`flush` in :attr:`formatted`.
     """
 
-    def flush(self, rate=None, formatter=None):
+    def __init__(self, iterable=(), maxlen=None, *, overflow=DROP_OLDEST,
+                 spill=None, loop=None):
+        if overflow not in (DROP_OLDEST, DROP_NEWEST, BLOCK, SPILL):
+            raise ValueError('Unknown overflow policy %r' % overflow)
+        super().__init__(iterable, maxlen if overflow == DROP_OLDEST else None)
+        self.capacity = maxlen if maxlen is not None else float('inf')
+        self.overflow = overflow
+        self.spill = spill
+        self.loop = loop
+        self.dropped = 0
+        self.spilled = 0
+        self.formatted = 0
+        self._waiter = None
+
+    def append(self, metric):
+        """Appends metric, with respect of the overflow policy.
+
+        Returns:
+            bool: False if metric has been rejected
+        """
+        if len(self) >= self.capacity:
+            overflow = self.overflow
+            if overflow == DROP_OLDEST:
+                self.dropped += 1
+            elif overflow == SPILL and self.spill and self.spill(metric):
+                self.spilled += 1
+                return True
+            elif overflow != BLOCK:
+                self.dropped += 1
+                return False
+        super().append(metric)
+        return True
+
+    def extend(self, metrics):
+        for metric in metrics:
+            self.append(metric)
+
+    def reset(self):
+        """Forgets metrics, counters and waiters.
+        """
+        self.clear()
+        self.dropped = 0
+        self.spilled = 0
+        self.formatted = 0
+        self._waiter = None
+
+    def full(self):
+        return len(self) >= self.capacity
+
+    @asyncio.coroutine
+    def wait(self):
+        """Waits until there is room for another metric.
+        """
+        while self.full():
+            if self._waiter is None:
+                self._waiter = asyncio.Future(loop=self.loop)
+            yield from asyncio.shield(self._waiter)
+
+    def _release(self):
+        waiter, self._waiter = self._waiter, None
+        if not waiter.done():
+            waiter.set_result(None)
+
+    def popleft(self):
+        metric = super().popleft()
+        if self._waiter is not None and len(self) < self.capacity:
+            self._release()
+        return metric
+
+    def flush(self, formatter=None):
+        """Pops the metrics, and yields their lines given by formatter.
+
+        Lines already formatted are yielded as they are. Metrics that
+        formatter rejects with a ValueError are skipped, like the ones
+        without value, or events and service checks for daemons which do
+        not know them. Without formatter, metrics are yielded as they are.
+        """
         while True:
             try:
                 metric = self.popleft()
-                if isinstance(metric, Event):
-                    yield formatter(metric)
-                    continue
-                if metric.value is None:
-                    continue
-                if rate and metric.rate and rate < metric.rate:
-                    continue
-                if formatter:
-                    try:
-                        yield formatter(metric)
-                    except ValueError:
-                        continue
-                else:
-                    yield metric
             except IndexError:
-                raise StopIteration
+                return
+            if formatter is None:
+                yield metric
+                continue
+            if metric.__class__ is not str:
+                try:
+                    metric = formatter(metric)
+                except ValueError:
+                    continue
+            self.formatted += 1
+            yield metric
+
+
+class Inbox:
+    """Metrics registered by threads other than the one of the loop.
+
+    Each thread appends to its own buffer without taking any lock, and
+    the loop takes what has been appended with :meth:`drain`. A buffer
+    holds at most ``maxlen`` metrics, the others being counted in
+    :attr:`dropped`.
+
+    Producers call :meth:`notify` after appending, to know whether they
+    are the first since the last drain, and must wake up the loop.
+    """
+
+    def __init__(self, maxlen=None):
+        self.maxlen = maxlen if maxlen is not None else float('inf')
+        self.buffers = []
+        self.dropped = 0
+        self.notified = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return any(buffer for thread, buffer in self.buffers)
+
+    def append(self, metric):
+        """Appends metric to the buffer of the current thread.
+
+        Returns:
+            int: the length of this buffer, 0 if metric has been rejected
+        """
+        try:
+            buffer = self._local.buffer
+        except AttributeError:
+            buffer = self._local.buffer = []
+            with self._lock:
+                self.buffers.append((threading.current_thread(), buffer))
+        if len(buffer) >= self.maxlen:
+            with self._lock:
+                self.dropped += 1
+            return 0
+        buffer.append(metric)
+        return len(buffer)
+
+    def notify(self):
+        """Tells whether the loop has to be woken up since the last drain.
+        """
+        if self.notified:
+            return False
+        self.notified = True
+        return True
+
+    def drain(self):
+        """Returns the metrics appended since the last call.
+        """
+        # reset first, so metrics appended from now on wake the loop up,
+        # even if they are taken below
+        self.notified = False
+        metrics = []
+        with self._lock:
+            buffers = self.buffers
+            for thread, buffer in buffers:
+                # only what has been counted is removed, metrics appended
+                # meanwhile are kept for the next call
+                count = len(buffer)
+                metrics.extend(buffer[:count])
+                del buffer[:count]
+            if not all(thread.is_alive() for thread, buffer in buffers):
+                self.buffers = [(thread, buffer) for thread, buffer in buffers
+                                if buffer or thread.is_alive()]
+        return metrics
@@ -26,6 +26,8 @@ class Event:
     __slots__ = ('title', 'text', 'date_happened', 'hostname', 'alert_type',
                  'aggregation_key', 'priority', 'source_type_name', 'tags')
 
+    code = '_e'
+
     def __init__(self,
                  title,
                  text,
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+
+
+class Flusher:
+    """Drains a client from a single long-lived task.
+
+    The task wakes up every ``interval`` seconds, or sooner when
+    :meth:`wakeup` is called, and awaits ``callback``.
+    """
+
+    def __init__(self, callback, interval, *, loop=None):
+        """
+        Parameters:
+            callback (coroutine function): called on each wake up
+            interval (float): maximum delay between two calls, in seconds
+            loop (EventLoop): the event loop
+        """
+        self.callback = callback
+        self.interval = interval
+        self.loop = loop or asyncio.get_event_loop()
+        self.log = logging.getLogger(__name__)
+        self.task = None
+        self._waiter = None
+        self._pending = False
+        self._closing = False
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._closing = False
+        self.task = asyncio.Task(self.run(), loop=self.loop)
+
+    def reset(self):
+        """Forgets the task, which must be started again.
+        """
+        self.task = None
+        self._waiter = None
+        self._pending = False
+        self._closing = False
+
+    def wakeup(self):
+        self._pending = True
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    @asyncio.coroutine
+    def run(self):
+        while not self._closing:
+            if not self._pending:
+                self._waiter = asyncio.Future(loop=self.loop)
+                handle = self.loop.call_later(self.interval, self.wakeup)
+                try:
+                    yield from self._waiter
+                finally:
+                    handle.cancel()
+                    self._waiter = None
+            self._pending = False
+            try:
+                yield from self.callback()
+            except Exception:
+                self.log.exception('flush failed')
+
+    @asyncio.coroutine
+    def close(self):
+        """Stops the task once its current flush is done.
+        """
+        self._closing = True
+        self.wakeup()
+        if self.task is not None:
+            yield from self.task
+            self.task = None
@@ -0,0 +1,52 @@
+"""
+    Keeps forked processes away from the state of their parent.
+
+    Once a process forks, its children would share the sockets of the
+    clients created before, and send again the metrics their parent has
+    still to send. Every client is reset in children instead, which open
+    their own connections on their next send.
+
+    Before python 3.7, forks are not notified, and clients call
+    :func:`check` to notice them when they register and send.
+"""
+
+import os
+import weakref
+
+__all__ = ['track', 'check']
+
+_clients = weakref.WeakSet()
+_pid = os.getpid()
+
+
+def track(client):
+    """Resets client in forked processes.
+    """
+    _clients.add(client)
+
+
+def reset_clients():
+    global _pid
+    _pid = os.getpid()
+    for client in list(_clients):
+        client.reset()
+
+
+def check_pid():
+    """Resets clients if the process has changed since the last reset.
+    """
+    if os.getpid() != _pid:
+        reset_clients()
+
+
+def notified():
+    """Nothing to check, forks resetting clients by themselves.
+    """
+
+
+if hasattr(os, 'register_at_fork'):
+    # python >= 3.7
+    os.register_at_fork(after_in_child=reset_clients)
+    check = notified
+else:
+    check = check_pid
@@ -0,0 +1,173 @@
+"""
+    Guards against series exploding, like tags holding request ids.
+"""
+
+from aiomeasures.aggregators import normalize_tags
+from aiomeasures.clients.templates import series_tags
+from aiomeasures.metrics import Metric
+from aiomeasures.tags import TagSet
+from math import log
+
+__all__ = ['CardinalityLimiter', 'HyperLogLog']
+
+#: tags of the series absorbing the others
+OVERFLOW_TAGS = TagSet(['__overflow__'])
+
+MASK64 = (1 << 64) - 1
+
+
+class CardinalityLimiter:
+    """Bounds the number of series sent by a client.
+
+    Each metric name accepts at most ``max_tags`` distinct combinations
+    of tags, and all names together at most ``max_series`` series. Once
+    a name is full, metrics of new combinations are sent under its
+    ``__overflow__`` series instead, and counted in :attr:`folded`.
+    Once every series is taken, metrics of new names are rejected, and
+    counted in :attr:`rejected`. Metrics are not modified, the ones
+    folded being copies.
+
+    Admitted series are tracked exactly, so memory is bounded by both
+    limits. Beyond them, a :class:`HyperLogLog` per name estimates how
+    many combinations were really emitted, see :meth:`estimate`.
+    """
+
+    def __init__(self, *, max_tags=1000, max_series=10000, precision=10):
+        """
+        Both limits are lifted with None, the memory used by the limiter
+        being bounded by the other one only.
+
+        Parameters:
+            max_tags (int): maximum combinations of tags per name
+            max_series (int): maximum series for all names
+            precision (int): precision of estimates, from 4 to 16
+        """
+        self.max_tags = max_tags if max_tags is not None else float('inf')
+        self.max_series = (max_series if max_series is not None
+                           else float('inf'))
+        self.precision = precision
+        self.names = {}
+        self.keys = {}
+        self.overflows = {}
+        self.series = 0
+        self.folded = 0
+        self.rejected = 0
+
+    def __len__(self):
+        return self.series
+
+    def clear(self):
+        """Forgets every series admitted.
+        """
+        self.names.clear()
+        self.keys.clear()
+        self.overflows.clear()
+        self.series = 0
+
+    def limit(self, metric):
+        """Returns the metric to register in place of metric.
+
+        Returns:
+            Metric: metric, moved to the overflow series if needed, or None
+        """
+        if not isinstance(metric, Metric):
+            # events and service checks
+            return metric
+        key, alias = self.normalize(metric.tags)
+        known = self.names.get(metric.name)
+        if known is not None and key in known:
+            if alias is not None:
+                self.keys[alias] = key
+            return metric
+        if known is None:
+            if self.series >= self.max_series:
+                self.rejected += 1
+                return None
+            known = self.names[metric.name] = set()
+        if len(known) < self.max_tags and self.series < self.max_series:
+            known.add(key)
+            if alias is not None:
+                self.keys[alias] = key
+            self.series += 1
+            return metric
+        self.fold(metric.name, known, key)
+        return metric.__class__(metric.name, metric.value, rate=metric.rate,
+                                delta=metric.delta, tags=OVERFLOW_TAGS)
+
+    def normalize(self, tags):
+        """Returns the key of tags, and their alias unless already known.
+
+        Keys of admitted series are remembered by alias, normalizing
+        tags costing more than looking them up.
+        """
+        if tags.__class__ is TagSet:
+            return tags, None
+        alias = series_tags(tags)
+        key = self.keys.get(alias)
+        if key is not None:
+            return key, None
+        return normalize_tags(tags), alias
+
+    def fold(self, name, known, key):
+        overflow = self.overflows.get(name)
+        if overflow is None:
+            overflow = self.overflows[name] = HyperLogLog(self.precision)
+            for admitted in known:
+                overflow.add(admitted)
+        overflow.add(key)
+        self.folded += 1
+
+    def estimate(self, name):
+        """Returns the number of combinations of tags emitted for name.
+
+        The count is exact until the name overflows, estimated after.
+        """
+        overflow = self.overflows.get(name)
+        if overflow is not None:
+            return len(overflow)
+        return len(self.names.get(name, ()))
+
+
+class HyperLogLog:
+    """Estimates the number of distinct items with 2 ** precision bytes.
+
+    The standard error is about ``1.04 / sqrt(2 ** precision)``, so
+    3.25% with the default precision.
+    """
+
+    __slots__ = ('precision', 'registers', '_alpha')
+
+    def __init__(self, precision=10):
+        if not 4 <= precision <= 16:
+            raise ValueError('precision must be between 4 and 16')
+        m = 1 << precision
+        self.precision = precision
+        self.registers = bytearray(m)
+        self._alpha = 0.7213 / (1 + 1.079 / m)
+
+    def add(self, item):
+        x = mix(hash(item))
+        p = self.precision
+        index = x & ((1 << p) - 1)
+        rank = 64 - p - (x >> p).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def __len__(self):
+        registers = self.registers
+        m = len(registers)
+        estimate = self._alpha * m * m / sum(2.0 ** -r for r in registers)
+        zeros = registers.count(0)
+        if zeros and estimate <= 2.5 * m:
+            # linear counting is more accurate for small cardinalities
+            estimate = m * log(m / zeros)
+        return int(round(estimate))
+
+
+def mix(value):
+    """Spreads the bits of a hash over 64 bits (splitmix64 finalizer).
+    """
+    value &= MASK64
+    value = ((value ^ (value >> 30)) * 0xbf58476d1ce4e5b9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94d049bb133111eb) & MASK64
+    return value ^ (value >> 31)
@@ -5,7 +5,7 @@
 
 __all__ = [
     'Metric', 'CountingMetric', 'GaugeMetric',
-    'HistogramMetric', 'SetMetric', 'TimingMetric'
+    'HistogramMetric', 'SetMetric', 'TimingMetric', 'Milliseconds'
 ]
 
 
@@ -13,6 +13,9 @@ class Metric:
 
     __slots__ = ('name', 'value', 'rate', 'delta', 'tags')
 
+    #: type of the metric in lines, looked up by formatters
+    code = None
+
     def __init__(self, name, value, rate=None, delta=False, tags=None):
         """
         Parameters:
@@ -48,6 +51,8 @@ class CountingMetric(Metric):
     like the number of database requests or page views.
     """
 
+    code = 'c'
+
 
 class GaugeMetric(Metric):
     """Measure the value of a particular thing over time.
@@ -57,6 +62,8 @@ class GaugeMetric(Metric):
     connected to a system.
     """
 
+    code = 'g'
+
 
 class HistogramMetric(Metric):
     """Measure the statistical distribution of a set of values.
@@ -66,6 +73,8 @@ class HistogramMetric(Metric):
     uploaded by users.
     """
 
+    code = 'h'
+
 
 class SetMetric(Metric):
     """Count the number of unique elements in a group.
@@ -75,6 +84,8 @@ class SetMetric(Metric):
     sets are a great way to do that.
     """
 
+    code = 's'
+
 
 class TimingMetric(Metric):
     """Measure the statistical distribution of a set of values.
@@ -84,3 +95,24 @@ class TimingMetric(Metric):
     Timers are essentially a special case of histograms, so they are treated
     in the same manner by DogStatsD for backwards compatibility.
     """
+
+    code = 'ms'
+
+
+class Milliseconds(float):
+    """A duration, written with a fixed number of decimals.
+
+    Parameters:
+        value (float): duration in milliseconds
+        precision (int): number of decimals
+    """
+
+    __slots__ = ('template',)
+
+    def __new__(cls, value, precision=3):
+        obj = super().__new__(cls, value)
+        obj.template = '%%.%df' % precision
+        return obj
+
+    def __str__(self):
+        return self.template % self
@@ -0,0 +1,229 @@
+"""
+    Aggregates the metrics of every process of a host before forwarding.
+
+    Pre-fork servers run many workers per host, each one sending its own
+    lines. Workers can send to a local relay instead, which merges their
+    series and forwards them upstream once per interval::
+
+        python -m aiomeasures.relay --listen unix:///tmp/statsd.sock \\
+                                    --upstream udp://127.0.0.1:8125
+
+    Workers are then configured with ``Datadog('unix:///tmp/statsd.sock')``.
+    Lines which cannot be aggregated, like events, service checks or
+    timings without sketches, are forwarded untouched.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+from aiomeasures.aggregators import Aggregator
+from aiomeasures.clients.formatting import DOGSTATSD
+from aiomeasures.clients.templates import Templates
+from aiomeasures.collectors import Collector
+from aiomeasures.flushers import Flusher
+from aiomeasures.metrics import CountingMetric, GaugeMetric
+from aiomeasures.metrics import HistogramMetric, SetMetric, TimingMetric
+from aiomeasures.reporters import StatsDReporter
+from aiomeasures.util import parse_addr
+
+__all__ = ['Relay', 'parse_line']
+
+#: metrics of lines, by type
+TYPES = {
+    'c': CountingMetric,
+    'g': GaugeMetric,
+    'h': HistogramMetric,
+    's': SetMetric,
+    'ms': TimingMetric,
+}
+
+
+def parse_line(line):
+    """Parses a metric line.
+
+    Returns:
+        Metric: the metric, or None when line is not a single metric
+    """
+    name, sep, rest = line.partition(':')
+    if not sep or not name or name.startswith(('_e{', '_sc')):
+        return None
+    value, _, rest = rest.partition('|')
+    kind, _, rest = rest.partition('|')
+    cls = TYPES.get(kind)
+    if cls is None or not value:
+        return None
+    delta = cls is GaugeMetric and value[0] in '+-'
+    try:
+        rate, tags = parse_fields(rest)
+        if cls is not SetMetric:
+            value = parse_number(value)
+    except ValueError:
+        # unknown fields, multiple values or garbage
+        return None
+    return cls(name, value, rate=rate, delta=delta, tags=tags)
+
+
+def parse_fields(fields):
+    """Returns the rate and the tags of the fields following the type.
+
+    Raises:
+        ValueError: a field is unknown or invalid
+    """
+    rate = tags = None
+    for field in fields.split('|') if fields else ():
+        if field.startswith('@'):
+            rate = float(field[1:])
+        elif field.startswith('#'):
+            tags = sorted(field[1:].split(','))
+        else:
+            # timestamps, container ids and so on
+            raise ValueError('Unknown field %r' % field)
+    return rate, tags
+
+
+def parse_number(value):
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+class RelayProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, relay):
+        self.relay = relay
+
+    def datagram_received(self, data, addr):
+        self.relay.feed(data)
+
+    def error_received(self, exc):
+        self.relay.log.warning('error received %s', exc)
+
+
+class Relay:
+
+    def __init__(self, listen, upstream, *, interval=10, aggregator=None,
+                 max_packet_size=None, capacity=50000, loop=None):
+        """Aggregates datagrams received on listen, and sends to upstream
+
+        At most ``capacity`` lines which cannot be aggregated wait for the
+        next send, the oldest ones being dropped beyond.
+
+        Parameters:
+            listen (str): the address in the form udp://host:port or
+                          unix:///path/to/socket
+            upstream (str): the address of the stats daemon
+            interval (float): delay between two sends, in seconds
+            aggregator (Aggregator): merges metrics before sending
+            max_packet_size (int): maximum payload of a datagram
+            capacity (int): maximum number of pending lines
+            loop (EventLoop): the event loop
+        """
+        self.loop = loop or asyncio.get_event_loop()
+        self.log = logging.getLogger(__name__)
+        self.listen = parse_addr(listen, proto='udp')
+        if self.listen.proto not in ('udp', 'unix'):
+            raise ValueError('Relay listens on udp or unix sockets')
+        self.aggregator = aggregator or Aggregator()
+        self.collector = Collector([], capacity, loop=self.loop)
+        self.templates = Templates(DOGSTATSD)
+        self.reporter = StatsDReporter(upstream, loop=self.loop,
+                                       max_packet_size=max_packet_size)
+        self.flusher = Flusher(self.send, interval, loop=self.loop)
+        self.transport = None
+        self.received = 0
+
+    @asyncio.coroutine
+    def start(self):
+        """Listens and starts forwarding.
+        """
+        if self.listen.proto == 'unix':
+            if os.path.exists(self.listen.host):
+                os.unlink(self.listen.host)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            try:
+                sock.setblocking(False)
+                sock.bind(self.listen.host)
+            except OSError:
+                sock.close()
+                raise
+            endpoint = self.loop.create_datagram_endpoint(
+                lambda: RelayProtocol(self), sock=sock)
+        else:
+            endpoint = self.loop.create_datagram_endpoint(
+                lambda: RelayProtocol(self),
+                local_addr=(self.listen.host, self.listen.port))
+        self.transport, _ = yield from endpoint
+        self.flusher.start()
+
+    def feed(self, data):
+        """Absorbs the lines of a datagram.
+        """
+        add = self.aggregator.add
+        for line in data.decode('utf-8', 'replace').splitlines():
+            if not line:
+                continue
+            self.received += 1
+            metric = parse_line(line)
+            if metric is None or not add(metric):
+                self.collector.append(line)
+
+    @asyncio.coroutine
+    def send(self):
+        """Sends the aggregated series upstream.
+        """
+        self.collector.extend(self.aggregator.flush())
+        if not self.collector:
+            return
+        yield from self.reporter.connect()
+        metrics = self.collector.flush(formatter=self.templates.encode)
+        yield from self.reporter.send(metrics)
+
+    @asyncio.coroutine
+    def aclose(self):
+        """Stops listening, sends what is left and closes.
+        """
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+            path = self.listen.host
+            if self.listen.proto == 'unix' and os.path.exists(path):
+                os.unlink(path)
+        yield from self.flusher.close()
+        yield from self.send()
+        self.reporter.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--listen', required=True,
+                        help='udp://host:port or unix:///path/to/socket')
+    parser.add_argument('--upstream', default='udp://127.0.0.1:8125',
+                        help='address of the stats daemon')
+    parser.add_argument('--interval', type=float, default=10.,
+                        help='delay between two sends, in seconds')
+    parser.add_argument('--sketches', action='store_true',
+                        help='summarizes timings and histograms')
+    parser.add_argument('--capacity', type=int, default=50000,
+                        help='maximum number of pending lines')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    loop = asyncio.get_event_loop()
+    relay = Relay(args.listen, args.upstream, interval=args.interval,
+                  aggregator=Aggregator(sketches=args.sketches),
+                  capacity=args.capacity, loop=loop)
+    loop.run_until_complete(relay.start())
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(relay.aclose())
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
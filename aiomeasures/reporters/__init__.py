@@ -1,3 +1,7 @@
-from .statsd_reporter import StatsDReporter
+from aiomeasures.util import lazy_attributes
 
 __all__ = ['StatsDReporter']
+
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    'StatsDReporter': '.statsd_reporter',
+}, globals())
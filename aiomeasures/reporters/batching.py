@@ -0,0 +1,140 @@
+"""
+    Sends many datagrams with a single system call, on Linux.
+"""
+
+import ctypes
+import os
+import socket
+import sys
+
+__all__ = ['Batch', 'available']
+
+MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0x40)
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [
+        ('iov_base', ctypes.c_void_p),
+        ('iov_len', ctypes.c_size_t),
+    ]
+
+
+class msghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(iovec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int),
+    ]
+
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_hdr', msghdr),
+        ('msg_len', ctypes.c_uint),
+    ]
+
+
+def load():
+    """Returns sendmmsg from the libc, or None if it is missing.
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        func = ctypes.CDLL(None, use_errno=True).sendmmsg
+    except (OSError, AttributeError):
+        return None
+    func.argtypes = [ctypes.c_int, ctypes.c_void_p,
+                     ctypes.c_uint, ctypes.c_int]
+    func.restype = ctypes.c_int
+    return func
+
+
+sendmmsg = load()
+
+#: whether datagrams really go out together
+available = sendmmsg is not None
+
+
+class Batch:
+    """Datagrams written side by side into one buffer, sent together.
+
+    The buffer has a slot of ``size`` bytes per datagram, and the
+    headers given to sendmmsg are built once, so adding a datagram only
+    copies it into its slot and sets its length.
+
+    Parameters:
+        size (int): maximum size of a datagram
+        capacity (int): maximum number of datagrams
+    """
+
+    def __init__(self, size, capacity):
+        self.size = size
+        self.capacity = capacity
+        self.buffer = bytearray(size * capacity)
+        self.view = memoryview(self.buffer)
+        self.lengths = [0] * capacity
+        self.count = 0
+        self.headers = None
+        if available:
+            self.iovecs = (iovec * capacity)()
+            self.headers = (mmsghdr * capacity)()
+            # also keeps the buffer from being resized
+            self._memory = (ctypes.c_char * len(self.buffer)).from_buffer(
+                self.buffer)
+            base = ctypes.addressof(self._memory)
+            for i, (vec, header) in enumerate(zip(self.iovecs,
+                                                  self.headers)):
+                vec.iov_base = base + i * size
+                header.msg_hdr.msg_iov = ctypes.pointer(vec)
+                header.msg_hdr.msg_iovlen = 1
+
+    def __len__(self):
+        return self.count
+
+    def append(self, packet):
+        """Copies packet into the next slot.
+
+        Returns:
+            bool: whether the batch is full
+        """
+        i = self.count
+        offset = i * self.size
+        length = len(packet)
+        self.buffer[offset:offset + length] = packet
+        self.lengths[i] = length
+        if self.headers is not None:
+            self.iovecs[i].iov_len = length
+        self.count = i + 1
+        return self.count == self.capacity
+
+    def packets(self, start=0):
+        """Yields the datagrams from start, as views of the buffer.
+        """
+        size, view, lengths = self.size, self.view, self.lengths
+        for i in range(start, self.count):
+            yield view[i * size:i * size + lengths[i]]
+
+    def send(self, fd, start=0):
+        """Sends the datagrams from start through a connected socket.
+
+        Returns:
+            int: the number of datagrams sent
+        Raises:
+            OSError: the first datagram cannot be sent
+        """
+        if self.headers is None:
+            raise OSError('sendmmsg is not available')
+        address = ctypes.addressof(self.headers)
+        sent = sendmmsg(fd, address + start * ctypes.sizeof(mmsghdr),
+                        self.count - start, MSG_DONTWAIT)
+        if sent < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        return sent
+
+    def clear(self):
+        self.count = 0
@@ -1,89 +1,434 @@
 import asyncio
 import logging
+import socket
+import sys
+from . import batching
 from aiomeasures.util import parse_addr
 
+#: Default payload sizes, which avoid fragmentation of UDP over Ethernet,
+#: fit the default buffers of Unix datagram sockets and coalesce lines
+#: into large writes over TCP
+MAX_PACKET_SIZES = {
+    'tcp': 65536,
+    'udp': 1432,
+    'unix': 8192,
+}
+
+#: Default behavior when the socket buffer is full
+BACKPRESSURES = {
+    'tcp': 'wait',
+    'udp': 'drop',
+    'unix': 'drop',
+}
+
+#: Default number of datagrams sent by a single system call
+BATCH_SIZES = {
+    'udp': 64,
+    'unix': 64,
+}
+
 
 class StatsDReporter:
 
-    def __init__(self, addr, *, loop=None):
-        """Sends statistics to the stats daemon over UDP
+    #: delays between two connection attempts, in seconds
+    min_backoff = .1
+    max_backoff = 30.
+
+    def __init__(self, addr, *, loop=None, max_packet_size=None,
+                 oversized='send', backpressure=None,
+                 high_water=None, low_water=None, batch=None):
+        """Sends statistics to the stats daemon over UDP, TCP or Unix socket
+
+        Lines are packed into datagrams of at most ``max_packet_size``
+        bytes, and never split. A single line larger than that is either
+        sent alone (``oversized='send'``) or dropped and counted in
+        :attr:`dropped_lines` (``oversized='drop'``).
+
+        When the transport buffer goes over ``high_water`` bytes, packets
+        are either dropped and counted in :attr:`dropped_packets`
+        (``backpressure='drop'``, default for datagrams) or sent once the
+        buffer is back under ``low_water`` (``backpressure='wait'``,
+        default for TCP). A packet waiting for room when the connection
+        is lost is dropped and counted as well.
+
+        A lost connection is opened again on the next send, waiting from
+        :attr:`min_backoff` to :attr:`max_backoff` seconds between two
+        failed attempts. Metrics stay in the collector meanwhile.
+
+        On Linux, datagrams are sent ``batch`` at a time with a single
+        ``sendmmsg`` system call, instead of one call each. Elsewhere,
+        or with ``batch=0``, they are sent one by one.
 
         Parameters:
-            addr (str): the address in the form udp://host:port
+            addr (str): the address in the form udp://host:port,
+                        tcp://host:port or unix:///path/to/socket
             loop (EventLoop): the event loop
+            max_packet_size (int): maximum payload of a datagram or write
+            oversized (str): ``send`` or ``drop``
+            backpressure (str): ``drop`` or ``wait``
+            high_water (int): size of the transport buffer pausing sends
+            low_water (int): size of the transport buffer resuming sends
+            batch (int): maximum number of datagrams per system call
         """
         self.addr = parse_addr(addr, proto='udp')
+        backpressure = backpressure or BACKPRESSURES.get(self.addr.proto)
+        if oversized not in ('send', 'drop'):
+            raise ValueError('oversized must be send or drop')
+        if backpressure not in ('drop', 'wait'):
+            raise ValueError('backpressure must be drop or wait')
+        if batch is None:
+            batch = (BATCH_SIZES.get(self.addr.proto, 0)
+                     if batching.available else 0)
+        elif batch and self.addr.proto not in BATCH_SIZES:
+            raise ValueError('only datagrams are sent in batches')
         self.loop = loop or asyncio.get_event_loop()
         self.log = logging.getLogger(__name__)
-        self.protocol = None
+        self.max_packet_size = (max_packet_size
+                                or MAX_PACKET_SIZES.get(self.addr.proto, 1432))
+        self.oversized = oversized
+        self.backpressure = backpressure
+        self.high_water = high_water
+        self.low_water = low_water
+        self.batch_size = batch
+        self.dropped_lines = 0
+        self.dropped_packets = 0
+        self.bytes_sent = 0
+        self.packets_sent = 0
+        self.connect_errors = 0
+        self._send_errors = 0
+        self._buffer = None
+        self._batch = None
         self._connecting = asyncio.Lock(loop=self.loop)
+        self._backoff = self.min_backoff
+        self._retry_at = 0
         self.protocol = None
 
+    @property
+    def connected(self):
+        return self.protocol is not None and not self.protocol.closed
+
+    @property
+    def send_errors(self):
+        """Number of errors received by the sockets.
+        """
+        if self.protocol is None:
+            return self._send_errors
+        return self._send_errors + self.protocol.errors
+
     @asyncio.coroutine
     def send(self, metrics):
-        """Sends key/value pairs via UDP or TCP.
+        """Sends key/value pairs via UDP, TCP or Unix socket.
+
+        Metrics are left untouched when disconnected.
+        """
+        protocol = self.protocol
+        if protocol is None or protocol.closed:
+            return
+        # concurrent sends cannot share the same batch
+        batch, self._batch = self._batch, None
+        if batch is None and self.batch_size:
+            batch = batching.Batch(self.max_packet_size, self.batch_size)
+        try:
+            for packet in self.pack(metrics):
+                if protocol.paused:
+                    if batch:
+                        protocol.send_batch(batch)
+                    if self.backpressure == 'drop':
+                        self.dropped_packets += 1
+                        continue
+                    yield from protocol.drain()
+                    if protocol.closed:
+                        # the packet in hand is lost, remaining metrics
+                        # wait for the next connection
+                        self.dropped_packets += 1
+                        return
+                self._send_packet(protocol, batch, packet)
+            if batch:
+                protocol.send_batch(batch)
+        finally:
+            if batch is not None:
+                batch.clear()
+                self._batch = batch
+
+    def _send_packet(self, protocol, batch, packet):
+        """Sends packet right away, or once batch is full.
+        """
+        if batch is None:
+            protocol.send(packet)
+        elif len(packet) > batch.size:
+            # oversized lines sent alone, in order
+            if batch:
+                protocol.send_batch(batch)
+            protocol.send(packet)
+        elif batch.append(packet):
+            protocol.send_batch(batch)
+        self.packets_sent += 1
+        self.bytes_sent += len(packet)
+
+    def pack(self, metrics):
+        """Packs lines into packets of at most max_packet_size bytes.
+
+        Metrics are either lines, or lines already encoded and split
+        around their value, as returned by :meth:`Templates.encode`.
+        Encoded lines are written straight into a buffer allocated once,
+        and packets are views of this buffer, which are only valid until
+        the next packet is requested.
         """
-        msg = bytearray()
-        for i, metric in enumerate(metrics, start=1):
-            msg += bytes('%s\n' % metric, encoding='utf-8')
-            if i % 20 == 0:
-                # small packets
-                self.protocol.send(msg)
-                msg[:] = []
-        if msg:
-            self.protocol.send(msg)
-            msg[:] = []
+        limit = self.max_packet_size
+        # concurrent sends cannot share the same buffer
+        buffer, self._buffer = self._buffer, None
+        if buffer is None or len(buffer) != limit:
+            buffer = bytearray(limit)
+        view = memoryview(buffer)
+        size = 0
+        try:
+            for metric in metrics:
+                if metric.__class__ is tuple:
+                    end = write_encoded(buffer, size, metric)
+                    if end is not None:
+                        size = end
+                        continue
+                    lines = (b''.join(metric),)
+                else:
+                    lines = split_lines(metric, limit)
+                size = yield from self._pack_lines(buffer, view, size, lines)
+            if size:
+                yield view[:size]
+        finally:
+            self._buffer = buffer
+
+    def _pack_lines(self, buffer, view, size, lines):
+        """Writes lines into buffer from size, yielding what is full.
+
+        Returns:
+            int: the size of what is left in buffer
+        """
+        limit = len(buffer)
+        for line in lines:
+            end = size + len(line)
+            if end > limit:
+                if size:
+                    yield view[:size]
+                    size, end = 0, len(line)
+                if end > limit:
+                    if self.oversized == 'drop':
+                        self.dropped_lines += 1
+                        self.log.warning('drop line of %s bytes', len(line))
+                    else:
+                        yield line
+                    continue
+            buffer[size:end] = line
+            size = end
+        return size
 
     @asyncio.coroutine
     def connect(self):
-        if self.protocol:
+        if self.connected or self.loop.time() < self._retry_at:
             return
 
         with (yield from self._connecting):
-            if not self.protocol:
+            if self.connected or self.loop.time() < self._retry_at:
+                return
+            try:
                 transport, protocol = yield from connect(self.addr, self.loop)
-                self.protocol = protocol
+            except OSError as error:
+                self.connect_errors += 1
+                self.log.warning('cannot connect to %s: %s, retry in %ss',
+                                 self.addr, error, self._backoff)
+                self._retry_at = self.loop.time() + self._backoff
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+                return
+            if self.high_water is not None:
+                transport.set_write_buffer_limits(self.high_water,
+                                                  self.low_water)
+            self._backoff = self.min_backoff
+            if self.protocol is not None:
+                self._send_errors += self.protocol.errors
+            self.protocol = protocol
 
     def close(self):
-        self.protocol.close()
+        if self.protocol:
+            self.protocol.close()
+
+    def reset(self):
+        """Forgets the connection without closing it, and the counters.
+        """
+        self.protocol = None
+        self.dropped_lines = self.dropped_packets = 0
+        self.bytes_sent = self.packets_sent = 0
+        self.connect_errors = self._send_errors = 0
+        self._connecting = asyncio.Lock(loop=self.loop)
+        self._backoff = self.min_backoff
+        self._retry_at = 0
 
 
 class UDPProtocol(asyncio.Protocol):
 
-    def __init__(self):
+    def __init__(self, *, loop=None):
         self.log = logging.getLogger(__name__)
+        self.loop = loop or asyncio.get_event_loop()
+        self.transport = None
+        self.paused = False
+        self.closed = False
+        self.errors = 0
+        #: destination given to the transport along with each datagram
+        self.address = None
+        self._drain_waiter = None
+
+    @property
+    def peer(self):
+        return '%s:%s' % self.transport.get_extra_info('peername')[:2]
 
     def send(self, msg):
         self.log.debug('send %s', msg)
-        self.transport.sendto(msg)
+        self.transport.sendto(msg, self.address)
+
+    def send_batch(self, batch):
+        """Sends every datagram of batch, and clears it.
+
+        Datagrams go out with a single system call while the transport
+        has nothing buffered, and through the transport otherwise, which
+        keeps them in order and buffers what the socket cannot take.
+        """
+        self.log.debug('send %s datagrams', len(batch))
+        transport = self.transport
+        sent = 0
+        if (batching.available and not self.closed
+                and not transport.get_write_buffer_size()):
+            fd = transport.get_extra_info('socket').fileno()
+            while sent < len(batch):
+                try:
+                    sent += batch.send(fd, sent)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError as exc:
+                    # like the transport, skips the datagram
+                    self.error_received(exc)
+                    sent += 1
+        for packet in batch.packets(sent):
+            transport.sendto(packet, self.address)
+        batch.clear()
 
     def connection_made(self, transport):
-        addr = '%s:%s' % transport.get_extra_info('peername')
-        self.log.info('connected to %s', addr)
         self.transport = transport
+        self.log.info('connected to %s', self.peer)
 
     def datagram_received(self, data, addr):
         self.log.debug('received %s', data.decode())
 
     def error_received(self, exc):
-        addr = '%s:%s' % self.transport.get_extra_info('peername')
-        self.log.warning('error received %s %s', addr, exc)
+        self.errors += 1
+        self.log.warning('error received %s %s', self.peer, exc)
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        waiter, self._drain_waiter = self._drain_waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    @asyncio.coroutine
+    def drain(self):
+        """Waits until the socket buffer has been flushed.
+        """
+        if not self.paused:
+            return
+        if self._drain_waiter is None:
+            self._drain_waiter = asyncio.Future(loop=self.loop)
+        yield from self._drain_waiter
 
     def connection_lost(self, exc):
         self.log.warning("socket closed")
+        self.closed = True
+        self.resume_writing()
 
     def close(self):
+        self.closed = True
         if self.transport:
             self.transport.close()
 
 
+class UnixProtocol(UDPProtocol):
+
+    @property
+    def peer(self):
+        return self.transport.get_extra_info('peername')
+
+    def connection_made(self, transport):
+        super().connection_made(transport)
+        if sys.version_info < (3, 7):
+            # transports of sockets connected beforehand would call
+            # sendto(data, None)
+            self.address = transport.get_extra_info('peername')
+
+
+class TCPProtocol(UDPProtocol):
+
+    def send(self, msg):
+        self.log.debug('send %s', msg)
+        # the transport may keep a reference to what it cannot write yet,
+        # while msg is a reused buffer
+        self.transport.write(bytes(msg))
+
+    def data_received(self, data):
+        self.log.debug('received %s', data.decode())
+
+
+def write_encoded(buffer, size, metric):
+    """Writes an encoded line into buffer from size.
+
+    Returns:
+        int: where the line ends, or None if it does not fit
+    """
+    head, value, tail = metric
+    end = size + len(head) + len(value) + len(tail)
+    if end > len(buffer):
+        return None
+    middle = size + len(head)
+    buffer[size:middle] = head
+    size, middle = middle, middle + len(value)
+    buffer[size:middle] = value
+    buffer[middle:end] = tail
+    return end
+
+
+def split_lines(metric, limit):
+    """Returns the encoded lines of metric, a line or a batch of lines.
+    """
+    line = bytes('%s\n' % metric, encoding='utf-8')
+    if len(line) > limit and line.count(b'\n') > 1:
+        # batches of lines are split when they do not fit
+        return line.splitlines(keepends=True)
+    return (line,)
+
+
 @asyncio.coroutine
 def connect(addr, loop):
     if addr.proto == 'udp':
         transport, protocol = yield from loop.create_datagram_endpoint(
-            lambda: UDPProtocol(),
+            lambda: UDPProtocol(loop=loop),
             remote_addr=addr
         )
+    elif addr.proto == 'tcp':
+        transport, protocol = yield from loop.create_connection(
+            lambda: TCPProtocol(loop=loop),
+            host=addr.host,
+            port=addr.port
+        )
+    elif addr.proto == 'unix':
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.setblocking(False)
+            sock.connect(addr.host)
+        except OSError:
+            sock.close()
+            raise
+        transport, protocol = yield from loop.create_datagram_endpoint(
+            lambda: UnixProtocol(loop=loop),
+            sock=sock
+        )
     else:
         raise NotImplementedError()
     return transport, protocol
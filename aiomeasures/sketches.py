@@ -0,0 +1,161 @@
+"""
+    Quantile sketches, with the relative error guarantees of DDSketch.
+
+    Values are counted into logarithmic buckets, so that any quantile is
+    answered within ``relative_accuracy`` of the exact value while memory
+    stays bounded by ``max_bins`` buckets per sign.
+"""
+
+from math import ceil, log
+
+__all__ = ['Sketch']
+
+
+class Sketch:
+
+    __slots__ = ('relative_accuracy', 'max_bins', 'gamma', 'positives',
+                 'negatives', 'zeros', 'count', 'sum', 'min', 'max',
+                 '_multiplier', '_min_value')
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048):
+        """
+        Parameters:
+            relative_accuracy (float): error tolerated on quantiles
+            max_bins (int): maximum number of buckets per sign
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('relative_accuracy must be between 0 and 1')
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._multiplier = 1 / log(self.gamma)
+        self._min_value = 1e-9
+        self.positives = {}
+        self.negatives = {}
+        self.zeros = 0
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def avg(self):
+        if self.count:
+            return self.sum / self.count
+
+    def add(self, value, count=1):
+        """Adds value, count times.
+        """
+        if value > self._min_value:
+            store, key = self.positives, self._key(value)
+        elif value < -self._min_value:
+            store, key = self.negatives, self._key(-value)
+        else:
+            store = None
+            self.zeros += count
+        if store is not None:
+            store[key] = store.get(key, 0) + count
+            if len(store) > self.max_bins:
+                self._collapse(store)
+        self.count += count
+        self.sum += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def update(self, values):
+        """Adds every value of values.
+        """
+        values = values if isinstance(values, list) else list(values)
+        if not values:
+            return
+        key_of, min_value = self._key, self._min_value
+        positives, negatives = self.positives, self.negatives
+        zeros = 0
+        for value in values:
+            if value > min_value:
+                key = key_of(value)
+                positives[key] = positives.get(key, 0) + 1
+            elif value < -min_value:
+                key = key_of(-value)
+                negatives[key] = negatives.get(key, 0) + 1
+            else:
+                zeros += 1
+        for store in (positives, negatives):
+            if len(store) > self.max_bins:
+                self._collapse(store)
+        self.zeros += zeros
+        self.count += len(values)
+        self.sum += sum(values)
+        low, high = min(values), max(values)
+        if self.min is None or low < self.min:
+            self.min = low
+        if self.max is None or high > self.max:
+            self.max = high
+
+    def merge(self, other):
+        """Adds the content of other, which must share the same accuracy.
+        """
+        if other.gamma != self.gamma:
+            raise ValueError('Cannot merge sketches of different accuracy')
+        if not other.count:
+            return
+        for src, dest in ((other.positives, self.positives),
+                          (other.negatives, self.negatives)):
+            for key, count in src.items():
+                dest[key] = dest.get(key, 0) + count
+            if len(dest) > self.max_bins:
+                self._collapse(dest)
+        self.zeros += other.zeros
+        self.count += other.count
+        self.sum += other.sum
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+
+    def quantile(self, q):
+        """Returns an estimation of the q-quantile, with 0 <= q <= 1.
+        """
+        if not self.count:
+            return None
+        if not 0 <= q <= 1:
+            raise ValueError('q must be between 0 and 1')
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negatives, reverse=True):
+            seen += self.negatives[key]
+            if seen > rank:
+                return self._clamp(-self._value(key))
+        seen += self.zeros
+        if seen > rank:
+            return self._clamp(0)
+        for key in sorted(self.positives):
+            seen += self.positives[key]
+            if seen > rank:
+                return self._clamp(self._value(key))
+        return self.max
+
+    def _key(self, value):
+        """Returns the bucket of a positive value.
+        """
+        return int(ceil(log(value) * self._multiplier))
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def _clamp(self, value):
+        return min(max(value, self.min), self.max)
+
+    def _collapse(self, store):
+        # the lowest magnitudes are merged together, which keeps the
+        # accuracy of the upper quantiles
+        keys = sorted(store)
+        excess = keys[:len(keys) - self.max_bins]
+        target = keys[len(excess)]
+        for key in excess:
+            store[target] += store.pop(key)
@@ -0,0 +1,73 @@
+"""
+    Tags normalized once, for metrics sent many times.
+"""
+
+from collections.abc import Mapping
+from weakref import WeakValueDictionary
+
+__all__ = ['TagSet']
+
+
+class TagSet(frozenset):
+    """Immutable set of ``key:value`` tags.
+
+    Tag sets are interned: equal tags give the same object, which is
+    already sorted and encoded, and hashes as fast as any frozenset.
+    Use them in place of dicts or lists for series sent again and again::
+
+        tags = TagSet({'route': 'index', 'method': 'GET'})
+        client.incr('requests', tags=tags)
+
+    Parameters:
+        tags (dict, list, str): the tags
+    """
+
+    __slots__ = ('sorted', 'text', 'encoded', '_merges')
+
+    _interned = WeakValueDictionary()
+
+    def __new__(cls, tags=()):
+        if tags.__class__ is cls:
+            return tags
+        key = frozenset(normalize(tags))
+        obj = cls._interned.get(key)
+        if obj is None:
+            obj = super().__new__(cls, key)
+            obj.sorted = tuple(sorted(key))
+            obj.text = ','.join(obj.sorted)
+            obj.encoded = obj.text.encode('utf-8')
+            obj._merges = {}
+            cls._interned[key] = obj
+        return obj
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self.sorted))
+
+    def __reduce__(self):
+        return self.__class__, (self.sorted,)
+
+    def merge(self, other):
+        """Returns the union of both tag sets, computed once per pair.
+        """
+        if not other:
+            return self
+        if other.__class__ is not TagSet:
+            other = TagSet(other)
+        merged = self._merges.get(other)
+        if merged is None:
+            merged = self._merges[other] = TagSet(self | other)
+        return merged
+
+
+def normalize(tags):
+    """Yields tags as ``key:value`` strings.
+    """
+    if not tags:
+        return
+    if isinstance(tags, Mapping):
+        for item in tags.items():
+            yield '%s:%s' % item
+    elif isinstance(tags, str):
+        yield tags
+    else:
+        yield from tags
@@ -1,3 +1,5 @@
+import sys
+
 __all__ = ['parse_addr']
 
 
@@ -19,6 +21,8 @@ class Address(tuple):
         return other == (self.proto, self.host, self.port)
 
     def __str__(self):
+        if self.port is None:
+            return '%s://%s' % (self.proto, self.host)
         return '%s://%s:%s' % (self.proto, self.host, self.port)
 
 
@@ -59,3 +63,34 @@ def parse_addr(addr, *, proto=None, host=None):
     if port is not None:
         port = int(port)
     return Address(proto, host, port)
+
+
+def lazy_attributes(package, attributes, namespace):
+    """Loads the attributes of a package on first access.
+
+    Parameters:
+        package (str): name of the package
+        attributes (dict): relative module of each attribute
+        namespace (dict): globals of the package
+
+    Returns:
+        tuple: the ``__getattr__`` and ``__dir__`` of the package
+    """
+    def __getattr__(name):
+        module = attributes.get(name)
+        if module is None:
+            raise AttributeError('module %r has no attribute %r'
+                                 % (package, name))
+        from importlib import import_module
+        value = getattr(import_module(module, package), name)
+        namespace[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(namespace) | set(attributes))
+
+    if sys.version_info < (3, 7):
+        # modules cannot define __getattr__
+        for name in attributes:
+            __getattr__(name)
+    return __getattr__, __dir__
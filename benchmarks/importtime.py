@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+    Measures how long ``import aiomeasures`` takes in a fresh interpreter.
+
+    The best of several runs of ``python -X importtime`` is compared to a
+    budget, and the script fails when it goes over, or when the import
+    loads modules it should not::
+
+        python benchmarks/importtime.py --budget 10
+"""
+
+import argparse
+import os
+import os.path
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+#: modules a bare import must not load
+FORBIDDEN = ['asyncio', 'subprocess', 'aiomeasures._version']
+
+SCRIPT = '''
+import sys
+import aiomeasures
+print(','.join(name for name in %r if name in sys.modules))
+''' % FORBIDDEN
+
+
+def measure():
+    """Returns the cumulative import time in microseconds, and the
+    forbidden modules loaded.
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.pop('PYTHONSTARTUP', None)
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-S', '-c', SCRIPT],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    for line in process.stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == 'aiomeasures':
+            loaded = process.stdout.strip()
+            return int(fields[1]), loaded.split(',') if loaded else []
+    raise RuntimeError('aiomeasures not found in:\n%s' % process.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--budget', type=float, default=10.,
+                        help='maximum import time, in milliseconds')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+    if sys.version_info < (3, 7):
+        parser.error('python -X importtime requires python 3.7')
+
+    timings, loaded = [], []
+    for i in range(args.repeat):
+        timing, loaded = measure()
+        timings.append(timing)
+    best = min(timings) / 1000
+    print('import aiomeasures %10.2f ms (budget %.2f ms)'
+          % (best, args.budget))
+    failed = False
+    if loaded:
+        print('imports %s' % ', '.join(loaded))
+        failed = True
+    if best > args.budget:
+        print('over budget')
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
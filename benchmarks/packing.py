@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+    Packets needed to send 1000 metrics, with the former fixed packing of
+    20 lines per datagram and with the size-aware packing of
+    StatsDReporter.
+
+    Usage::
+
+        python benchmarks/packing.py
+"""
+
+import asyncio
+import os.path
+import sys
+from random import Random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from aiomeasures import Datadog, CountingMetric, TimingMetric  # noqa
+from aiomeasures.reporters import StatsDReporter  # noqa
+
+
+class Recorder:
+
+    def __init__(self):
+        self.packets = []
+
+    def send(self, msg):
+        self.packets.append(len(msg))
+
+
+def workloads():
+    rand = Random(0)
+    short = [CountingMetric('hits', 1) for i in range(1000)]
+    tagged = [
+        TimingMetric('http.request.duration', rand.randint(1, 2000), tags={
+            'endpoint': '/api/v1/users/%s/profile' % rand.randint(1, 99),
+            'method': rand.choice(['GET', 'POST', 'DELETE']),
+            'status': rand.choice([200, 201, 404, 500]),
+            'service': 'accounts-frontend',
+            'env': 'production',
+            'region': 'eu-west-1',
+        })
+        for i in range(1000)
+    ]
+    mixed = [rand.choice([short[i], tagged[i]]) for i in range(1000)]
+    return [('short', short), ('tagged', tagged), ('mixed', mixed)]
+
+
+def fixed_packing(lines, protocol):
+    msg = bytearray()
+    for i, line in enumerate(lines, start=1):
+        msg += bytes('%s\n' % line, encoding='utf-8')
+        if i % 20 == 0:
+            protocol.send(msg)
+            msg[:] = []
+    if msg:
+        protocol.send(msg)
+
+
+def main():
+    loop = asyncio.new_event_loop()
+    client = Datadog(':0', loop=loop)
+    header = '%-8s %-8s %8s %10s %12s' % (
+        'workload', 'mtu', 'packing', 'packets', 'over mtu')
+    print(header)
+    print('-' * len(header))
+    for name, metrics in workloads():
+        lines = [client.format(metric) for metric in metrics]
+        for proto, mtu in (('udp', 1432), ('unix', 8192)):
+            before = Recorder()
+            fixed_packing(lines, before)
+
+            reporter = StatsDReporter('%s://localhost:0' % proto, loop=loop)
+            reporter.protocol = after = Recorder()
+            loop.run_until_complete(reporter.send(lines))
+
+            for label, recorder in (('fixed', before), ('size', after)):
+                over = sum(1 for size in recorder.packets if size > mtu)
+                print('%-8s %-8s %8s %10s %12s' % (
+                    name, mtu, label, len(recorder.packets), over))
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
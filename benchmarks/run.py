@@ -0,0 +1,452 @@
+#!/usr/bin/env python
+"""
+    Benchmarks of the metric hot path: register, format and send.
+
+    Each benchmark runs ``ops`` operations several times and keeps the
+    best run, reported in nanoseconds per operation. Results are written
+    as JSON, and can be compared with the results of another release::
+
+        python benchmarks/run.py --output before.json
+        python benchmarks/run.py --output after.json --compare before.json
+        python benchmarks/run.py --filter format
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import os.path
+import platform
+import socket
+import sys
+import tempfile
+from collections import OrderedDict
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import aiomeasures  # noqa
+from aiomeasures import CountingMetric, GaugeMetric, HistogramMetric  # noqa
+from aiomeasures import SetMetric, TimingMetric  # noqa
+from aiomeasures.collectors import Collector  # noqa
+from aiomeasures.reporters import StatsDReporter  # noqa
+
+BENCHMARKS = OrderedDict()
+
+TAGS = {'endpoint': '/api/users', 'method': 'GET', 'status': 200}
+
+
+def benchmark(name, ops=100000):
+    """Registers a benchmark.
+
+    The decorated function receives the number of operations, and
+    returns a callable running them once, and optionally a teardown.
+    """
+    def decorate(func):
+        BENCHMARKS[name] = func, ops
+        return func
+    return decorate
+
+
+def new_client(**kwargs):
+    kwargs.setdefault('flush_interval', 60)
+    kwargs.setdefault('capacity', None)
+    return aiomeasures.Datadog('udp://127.0.0.1:9', **kwargs)
+
+
+@benchmark('client.incr')
+def bench_incr(ops):
+    client = new_client()
+
+    def run():
+        incr = client.incr
+        for i in range(ops):
+            incr('requests')
+        client.collector.clear()
+    return run
+
+
+@benchmark('client.incr.tagged')
+def bench_incr_tagged(ops):
+    client = new_client()
+
+    def run():
+        incr = client.incr
+        for i in range(ops):
+            incr('requests', tags=TAGS)
+        client.collector.clear()
+    return run
+
+
+@benchmark('client.incr.tagset')
+def bench_incr_tagset(ops):
+    client = new_client()
+    tags = aiomeasures.TagSet(TAGS)
+
+    def run():
+        incr = client.incr
+        for i in range(ops):
+            incr('requests', tags=tags)
+        client.collector.clear()
+    return run
+
+
+@benchmark('client.incr.limited')
+def bench_incr_limited(ops):
+    client = new_client(limiter=aiomeasures.CardinalityLimiter())
+    tags = aiomeasures.TagSet(TAGS)
+
+    def run():
+        incr = client.incr
+        for i in range(ops):
+            incr('requests', tags=tags)
+        client.collector.clear()
+    return run
+
+
+@benchmark('client.incr.limited.dict')
+def bench_incr_limited_dict(ops):
+    client = new_client(limiter=aiomeasures.CardinalityLimiter())
+
+    def run():
+        incr = client.incr
+        for i in range(ops):
+            incr('requests', tags=TAGS)
+        client.collector.clear()
+    return run
+
+
+@benchmark('client.incr.sampled', ops=1000000)
+def bench_incr_sampled(ops):
+    client = new_client()
+
+    def run():
+        incr = client.incr
+        for i in range(ops):
+            incr('requests', rate=0.01)
+        client.collector.clear()
+    return run
+
+
+@benchmark('client.incr.aggregated')
+def bench_incr_aggregated(ops):
+    client = new_client(aggregator=aiomeasures.Aggregator())
+
+    def run():
+        incr = client.incr
+        for i in range(ops):
+            incr('requests', tags=TAGS)
+        list(client.aggregator.flush())
+    return run
+
+
+@benchmark('handle.incr', ops=1000000)
+def bench_handle(ops):
+    client = new_client()
+    handle = client.counter_handle('requests', tags=TAGS)
+
+    def run():
+        incr = handle.incr
+        for i in range(ops):
+            incr()
+        handle.collect()
+    return run
+
+
+@benchmark('client.timer')
+def bench_timer(ops):
+    client = new_client()
+
+    def run():
+        timer = client.timer
+        for i in range(ops):
+            with timer('duration'):
+                pass
+        client.collector.clear()
+    return run
+
+
+@benchmark('client.histogram')
+def bench_histogram(ops):
+    client = new_client()
+    values = [i * 1.5 for i in range(ops)]
+
+    def run():
+        histogram = client.histogram
+        for value in values:
+            histogram('size', value)
+        client.collector.clear()
+    return run
+
+
+@benchmark('client.histogram_many')
+def bench_histogram_many(ops):
+    client = new_client()
+    values = [i * 1.5 for i in range(ops)]
+
+    def run():
+        client.histogram_many('size', values)
+        client.collector.clear()
+    return run
+
+
+@benchmark('client.histogram_many.aggregated')
+def bench_histogram_many_aggregated(ops):
+    client = new_client(aggregator=aiomeasures.Aggregator(sketches=True))
+    values = [i * 1.5 for i in range(ops)]
+
+    def run():
+        client.histogram_many('size', values)
+        list(client.aggregator.flush())
+    return run
+
+
+def format_benchmark(name, metric):
+    def bench(ops):
+        client = new_client()
+
+        def run():
+            fmt = client.format
+            for i in range(ops):
+                fmt(metric)
+        return run
+    benchmark(name)(bench)
+
+
+for metric in (CountingMetric('foo', 1), GaugeMetric('foo', 42),
+               HistogramMetric('foo', 42), SetMetric('foo', 'bar'),
+               TimingMetric('foo', 100)):
+    kind = metric.__class__.__name__[:-len('Metric')].lower()
+    format_benchmark('format.%s' % kind, metric)
+    tagged = metric.__class__(metric.name, metric.value, tags=TAGS)
+    format_benchmark('format.%s.tagged' % kind, tagged)
+    tagset = aiomeasures.TagSet(TAGS)
+    tagged = metric.__class__(metric.name, metric.value, tags=tagset)
+    format_benchmark('format.%s.tagset' % kind, tagged)
+
+
+@benchmark('collector.flush')
+def bench_flush(ops):
+    client = new_client()
+    metrics = [TimingMetric('foo', i, tags=TAGS) for i in range(ops)]
+
+    def run():
+        collector = Collector([], None)
+        collector.extend(metrics)
+        for line in collector.flush(formatter=client.format):
+            pass
+    return run
+
+
+def prometheus_client(ops):
+    client = aiomeasures.Prometheus(':0', tags={'env': 'prod'})
+    for i in range(ops):
+        client.incr('requests', tags={'route': '/api/%s' % (i % 1000),
+                                      'status': i // 1000})
+    return client
+
+
+@benchmark('prometheus.render')
+def bench_prometheus_render(ops):
+    client = prometheus_client(ops)
+    series = [series for family in client.registry.families.values()
+              for series in family.series.values()]
+
+    def run():
+        for item in series:
+            item.chunk = None
+        client.render()
+    return run
+
+
+@benchmark('prometheus.render.cached')
+def bench_prometheus_render_cached(ops):
+    client = prometheus_client(ops)
+    client.render()
+
+    def run():
+        client.render()
+    return run
+
+
+def pack_benchmark(name, method):
+    def bench(ops):
+        client = new_client()
+        metrics = [TimingMetric('foo.%s' % (i % 100), i, tags=TAGS)
+                   for i in range(ops)]
+        encode = getattr(client, method)
+
+        def run():
+            for packet in client.reporter.pack(map(encode, metrics)):
+                pass
+        return run
+    benchmark(name, ops=10000)(bench)
+
+
+pack_benchmark('pack.format', 'format')
+pack_benchmark('pack.encode', 'encode')
+
+
+def send_benchmark(name, batch):
+    def bench(ops):
+        loop = asyncio.new_event_loop()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 24)
+        reporter = StatsDReporter(
+            'udp://127.0.0.1:%s' % sock.getsockname()[1], loop=loop,
+            max_packet_size=64, batch=batch)
+        loop.run_until_complete(reporter.connect())
+        # one datagram per line
+        lines = ['requests.%06d:1|c|#route:index' % i for i in range(ops)]
+
+        def run():
+            loop.run_until_complete(reporter.send(lines))
+
+        def teardown():
+            reporter.close()
+            loop.run_until_complete(asyncio.sleep(0, loop=loop))
+            loop.close()
+            sock.close()
+            return {'send_errors': reporter.send_errors}
+        return run, teardown
+    benchmark(name, ops=50000)(bench)
+
+
+send_benchmark('reporter.send.udp', 0)
+send_benchmark('reporter.send.udp.sendmmsg', 64)
+
+
+class Sink:
+
+    def __init__(self):
+        self.lines = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.lines += data.count(b'\n')
+
+    def error_received(self, exc):
+        pass
+
+    def connection_lost(self, exc):
+        pass
+
+
+def end_to_end(addr, sock, ops):
+    loop = asyncio.new_event_loop()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 24)
+    transport, sink = loop.run_until_complete(
+        loop.create_datagram_endpoint(lambda: Sink(), sock=sock))
+
+    @asyncio.coroutine
+    def emit():
+        client = aiomeasures.Datadog(addr, loop=loop, flush_interval=.01,
+                                     capacity=None, flush_size=1000)
+        client.start()
+        for i in range(ops):
+            client.incr('requests', tags=TAGS)
+            if i % 1000 == 0:
+                yield from asyncio.sleep(0, loop=loop)
+        yield from client.aclose()
+
+    def run():
+        loop.run_until_complete(emit())
+
+    def teardown():
+        loop.run_until_complete(asyncio.sleep(.1, loop=loop))
+        transport.close()
+        loop.close()
+        return {'received': sink.lines}
+    return run, teardown
+
+
+@benchmark('end_to_end.udp', ops=50000)
+def bench_udp(ops):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    addr = 'udp://127.0.0.1:%s' % sock.getsockname()[1]
+    return end_to_end(addr, sock, ops)
+
+
+@benchmark('end_to_end.unix', ops=50000)
+def bench_unix(ops):
+    path = os.path.join(tempfile.mkdtemp(), 'sink.sock')
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(path)
+    return end_to_end('unix://%s' % path, sock, ops)
+
+
+def measure(func, ops, repeat):
+    prepared = func(ops)
+    run, teardown = (prepared if isinstance(prepared, tuple)
+                     else (prepared, None))
+    timings = []
+    for i in range(repeat):
+        # like timeit, keeps the garbage collector out of measures
+        gc.collect()
+        gc.disable()
+        try:
+            started = perf_counter()
+            run()
+            timings.append(perf_counter() - started)
+        finally:
+            gc.enable()
+    result = OrderedDict([
+        ('ops', ops),
+        ('repeat', repeat),
+        ('ns_per_op', min(timings) / ops * 1e9),
+        ('median_ns_per_op', sorted(timings)[repeat // 2] / ops * 1e9),
+    ])
+    if teardown:
+        result.update(teardown() or {})
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--output', help='writes results to this JSON file')
+    parser.add_argument('--compare', help='JSON results to compare with')
+    parser.add_argument('--filter', default='',
+                        help='only runs benchmarks containing this string')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scale', type=float, default=1.,
+                        help='multiplies the number of operations')
+    args = parser.parse_args(argv)
+    logging.getLogger('aiomeasures').setLevel(logging.ERROR)
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)['results']
+
+    results = OrderedDict()
+    for name, (func, ops) in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        ops = max(int(ops * args.scale), 1)
+        results[name] = result = measure(func, ops, args.repeat)
+        line = '%-28s %10.1f ns/op' % (name, result['ns_per_op'])
+        if name in previous:
+            ratio = result['ns_per_op'] / previous[name]['ns_per_op']
+            line += '  %6.2fx' % ratio
+        print(line)
+
+    if args.output:
+        report = OrderedDict([
+            ('aiomeasures', aiomeasures.__version__),
+            ('python', platform.python_version()),
+            ('implementation', platform.python_implementation()),
+            ('platform', platform.platform()),
+            ('results', results),
+        ])
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
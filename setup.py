@@ -36,7 +36,8 @@ setup(
     keywords=[''],
     install_requires=[],
     extras_require={
-        ':python_version=="3.3"': ['asyncio', 'singledispatch'],
+        ':python_version=="3.3"': ['asyncio'],
+        'numpy': ['numpy'],
     },
     classifiers=[
         "Development Status :: 5 - Production/Stable",
@@ -14,3 +14,43 @@ os.environ['PYTHONASYNCIODEBUG'] = '1'
 warnings.simplefilter("always")
 warnings.filterwarnings('ignore', '.*sys.meta_path is empty.*')
 warnings.filterwarnings('ignore', '.*deprecated.*', module='site')
+
+collect_ignore = []
+if sys.version_info < (3, 6):
+    # async def, async with and asynchronous generators
+    collect_ignore.append('test_timer_native.py')
+
+
+class UDPServer:
+    """Keeps the lines of the datagrams received.
+    """
+
+    def __init__(self):
+        self.msg = []
+        self.transport = None
+
+    @property
+    def address(self):
+        return 'udp://127.0.0.1:%s' % self.transport.get_extra_info(
+            'sockname')[1]
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.msg.extend(data.decode().split())
+
+    def error_received(self, exc):
+        pass
+
+    def connection_lost(self, exc):
+        pass
+
+
+@fixture
+def udp_server(event_loop):
+    _, server = event_loop.run_until_complete(
+        event_loop.create_datagram_endpoint(
+            UDPServer, local_addr=('127.0.0.1', 0)))
+    yield server
+    server.transport.close()
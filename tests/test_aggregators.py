@@ -0,0 +1,64 @@
+import aiomeasures
+from aiomeasures import Aggregator, CountingMetric, GaugeMetric, SetMetric
+from aiomeasures import TimingMetric
+
+
+def flushed(aggregator):
+    handler = aiomeasures.Datadog(':0')
+    return sorted(handler.format(metric) for metric in aggregator.flush())
+
+
+def test_counters():
+    aggregator = Aggregator()
+    assert aggregator.add(CountingMetric('foo', 1))
+    assert aggregator.add(CountingMetric('foo', 2))
+    assert aggregator.add(CountingMetric('foo', -1))
+    assert aggregator.add(CountingMetric('foo', 1, tags={'bar': 'baz'}))
+    assert aggregator.add(CountingMetric('foo', 1, tags=['bar:baz']))
+    assert aggregator.add(CountingMetric('foo', 1, rate=0.1))
+    assert len(aggregator) == 3
+    assert flushed(aggregator) == [
+        'foo:1|c|@0.1',
+        'foo:2|c',
+        'foo:2|c|#bar:baz',
+    ]
+    assert not len(aggregator)
+    assert flushed(aggregator) == []
+
+
+def test_gauges():
+    aggregator = Aggregator()
+    aggregator.add(GaugeMetric('foo', 1))
+    aggregator.add(GaugeMetric('foo', 5))
+    aggregator.add(GaugeMetric('bar', 1, delta=True))
+    aggregator.add(GaugeMetric('bar', 3, delta=True))
+    aggregator.add(GaugeMetric('baz', 1, delta=True))
+    aggregator.add(GaugeMetric('baz', 10))
+    aggregator.add(GaugeMetric('baz', -2, delta=True))
+    assert flushed(aggregator) == ['bar:+4|g', 'baz:8|g', 'foo:5|g']
+
+    # no change at all, where 0|g would reset the gauge
+    aggregator.add(GaugeMetric('conns', 1, delta=True))
+    aggregator.add(GaugeMetric('conns', -1, delta=True))
+    assert flushed(aggregator) == []
+
+    # -2|g alone would decrement the gauge
+    aggregator.add(GaugeMetric('temp', 10))
+    aggregator.add(GaugeMetric('temp', -12, delta=True))
+    handler = aiomeasures.Datadog(':0')
+    lines = [handler.format(metric) for metric in aggregator.flush()]
+    assert lines == ['temp:0|g', 'temp:-2|g']
+
+
+def test_sets():
+    aggregator = Aggregator()
+    for value in ('a', 'b', 'a', 'a', 'c', 'b'):
+        aggregator.add(SetMetric('foo', value))
+    assert flushed(aggregator) == ['foo:a|s', 'foo:b|s', 'foo:c|s']
+
+
+def test_passthrough():
+    aggregator = Aggregator()
+    assert not aggregator.add(TimingMetric('foo', 100))
+    assert not aggregator.add(CountingMetric('foo', None))
+    assert not len(aggregator)
@@ -0,0 +1,73 @@
+import pytest
+from aiomeasures import Aggregator, Datadog, StatsD
+
+
+def lines(client):
+    return [line for item in client.collector.flush(formatter=client.format)
+            for line in item.split('\n')]
+
+
+@pytest.mark.parametrize('cls,size,duration', [
+    (Datadog, 'app.size:%s|h|#a:b,env:test', 'app.duration:%s|ms|#env:test'),
+    (StatsD, 'app.size;a=b;env=test:%s|ms', 'app.duration;env=test:%s|ms'),
+])
+def test_histogram_many(cls, size, duration):
+    client = cls(':0', prefix='app', tags={'env': 'test'}, flush_interval=60)
+    client.histogram_many('size', [1, 2.5, 3], tags=['a:b'])
+    client.timing_many('duration', (i for i in range(3)))
+    client.histogram_many('empty', [])
+    assert len(client.collector) == 2
+    assert lines(client) == [size % 1, size % 2.5, size % 3,
+                             duration % 0, duration % 1, duration % 2]
+
+
+def test_counter_many():
+    client = Datadog(':0', flush_interval=60)
+    client.counter_many('hits', [1, 2, 3], tags={'a': 'b'})
+    assert lines(client) == ['hits:6|c|#a:b']
+
+
+def test_sampling():
+    client = Datadog(':0', flush_interval=60)
+    client.histogram_many('size', range(10000), rate=0.1)
+    client.histogram_many('never', range(100), rate=0)
+    sent = lines(client)
+    assert 500 < len(sent) < 1500
+    assert all(line.endswith('|h|@0.1') for line in sent)
+
+
+def test_aggregated():
+    client = Datadog(':0', flush_interval=60,
+                     aggregator=Aggregator(sketches=True, percentiles=()))
+    client.histogram_many('size', [1, 2, 3], tags=['a:b'])
+    client.timing_many('duration', [10, 20])
+    client.counter_many('hits', [1, 2])
+    client.counter_many('hits', [3])
+    assert not client.collector
+    client.collector.extend(client.aggregator.flush())
+    assert sorted(lines(client)) == [
+        'duration.avg:15.0|g',
+        'duration.count:2|c',
+        'duration.max:20|g',
+        'duration.min:10|g',
+        'hits:6|c',
+        'size.avg:2.0|g|#a:b',
+        'size.count:3|c|#a:b',
+        'size.max:3|g|#a:b',
+        'size.min:1|g|#a:b',
+    ]
+
+
+def test_unaggregated_samples():
+    client = Datadog(':0', flush_interval=60, aggregator=Aggregator())
+    client.histogram_many('size', [1, 2])
+    assert lines(client) == ['size:1|h', 'size:2|h']
+
+
+def test_numpy():
+    numpy = pytest.importorskip('numpy')
+    client = Datadog(':0', flush_interval=60)
+    client.histogram_many('size', numpy.array([1.5, 2, 3]))
+    client.counter_many('hits', numpy.arange(4))
+    assert lines(client) == ['size:1.5|h', 'size:2.0|h', 'size:3.0|h',
+                             'hits:6|c']
@@ -0,0 +1,105 @@
+import aiomeasures
+import asyncio
+import pytest
+
+clients = [aiomeasures.Datadog, aiomeasures.StatsD]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('cls', clients)
+def test_flusher(cls, udp_server):
+    client = cls(udp_server.address, flush_interval=.01, flush_size=3)
+    client.start()
+    client.incr('flushed.a')
+    client.incr('flushed.b')
+    assert len(client.collector) == 2
+    yield from asyncio.sleep(.1)
+    assert not client.collector
+    assert 'flushed.a:1|c' in udp_server.msg
+    assert 'flushed.b:1|c' in udp_server.msg
+
+    client.incr('flushed.c')
+    yield from client.aclose()
+    yield from asyncio.sleep(.1)
+    assert 'flushed.c:1|c' in udp_server.msg
+    assert not client.flusher.running
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('cls', clients)
+def test_flush_size(cls, udp_server):
+    client = cls(udp_server.address, flush_interval=60, flush_size=3)
+    client.start()
+    client.incr('flushed.a')
+    client.incr('flushed.b')
+    yield from asyncio.sleep(.1)
+    assert len(client.collector) == 2
+    assert not udp_server.msg
+
+    # the third metric wakes the flusher up, long before its interval
+    client.incr('flushed.c')
+    yield from asyncio.sleep(.1)
+    assert not client.collector
+    assert udp_server.msg == ['flushed.a:1|c', 'flushed.b:1|c',
+                              'flushed.c:1|c']
+    yield from client.aclose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('cls', clients)
+def test_aggregator(cls, udp_server):
+    client = cls(udp_server.address, flush_interval=.01,
+                 aggregator=aiomeasures.Aggregator())
+    client.start()
+    for i in range(100):
+        client.incr('aggregated.a')
+        client.gauge('aggregated.b', i)
+        client.timing('aggregated.c', 10)
+    assert len(client.collector) == 100
+    yield from client.aclose()
+    yield from asyncio.sleep(.1)
+    assert 'aggregated.a:100|c' in udp_server.msg
+    assert 'aggregated.b:99|g' in udp_server.msg
+    assert udp_server.msg.count('aggregated.c:10|ms') == 100
+
+
+handled = [
+    (aiomeasures.Datadog, 'handled:%s|c|#a:b'),
+    (aiomeasures.StatsD, 'handled;a=b:%s|c'),
+]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('cls,line', handled)
+def test_counter_handle(cls, line, udp_server):
+    client = cls(udp_server.address, flush_interval=.01)
+    handle = client.counter_handle('handled', tags={'a': 'b'})
+    assert client.counter_handle('handled', tags={'a': 'b'}) is handle
+    client.start()
+    for i in range(1000):
+        handle.incr()
+    handle.decr(10)
+    assert not client.collector
+    yield from asyncio.sleep(.1)
+    assert line % 990 in udp_server.msg
+
+    handle.incr(5)
+    yield from client.aclose()
+    yield from asyncio.sleep(.1)
+    assert udp_server.msg.count(line % 5) == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('cls,line', handled)
+def test_counter_handle_unflushed(cls, line, udp_server):
+    client = cls(udp_server.address)
+    handle = client.counter_handle('handled', tags={'a': 'b'})
+    for i in range(1000):
+        handle.incr()
+    yield from asyncio.sleep(.1)
+    assert udp_server.msg == [line % 1000]
+
+    handle.decr(10)
+    yield from asyncio.sleep(.1)
+    assert udp_server.msg == [line % 1000, line % -10]
+    client.close()
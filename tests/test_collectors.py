@@ -0,0 +1,125 @@
+import aiomeasures
+import asyncio
+import pytest
+import threading
+from aiomeasures import CountingMetric, TimingMetric
+from aiomeasures.collectors import Collector, Inbox
+
+
+def names(collector):
+    return [metric.name for metric in collector.flush()]
+
+
+def fill(collector, count):
+    return [collector.append(CountingMetric('m%s' % i, 1))
+            for i in range(count)]
+
+
+def test_drop_oldest():
+    collector = Collector([], 3)
+    assert fill(collector, 5) == [True] * 5
+    assert collector.dropped == 2
+    assert names(collector) == ['m2', 'm3', 'm4']
+
+
+def test_drop_newest():
+    collector = Collector([], 3, overflow='drop_newest')
+    assert fill(collector, 5) == [True, True, True, False, False]
+    assert collector.dropped == 2
+    assert names(collector) == ['m0', 'm1', 'm2']
+
+
+def test_spill():
+    aggregator = aiomeasures.Aggregator()
+    collector = Collector([], 2, overflow='spill', spill=aggregator.add)
+    assert fill(collector, 4) == [True] * 4
+    assert collector.append(TimingMetric('t', 1)) is False
+    assert collector.spilled == 2
+    assert collector.dropped == 1
+    assert len(aggregator) == 2
+    assert names(collector) == ['m0', 'm1']
+
+
+def test_formatter():
+    collector = Collector()
+    collector.extend([TimingMetric('a', None), aiomeasures.Event('t', 'x'),
+                      'b:1|c', TimingMetric('c', 1)])
+    formatter = aiomeasures.StatsD(':0').format
+    assert list(collector.flush(formatter)) == ['b:1|c', 'c:1|ms']
+    assert collector.formatted == 2
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        Collector([], 3, overflow='explode')
+
+
+@pytest.mark.asyncio
+def test_block(event_loop):
+    collector = Collector([], 3, overflow='block', loop=event_loop)
+    fill(collector, 4)
+    assert collector.full()
+    assert collector.dropped == 0
+    waiter = asyncio.Task(collector.wait())
+    yield from asyncio.sleep(.01)
+    assert not waiter.done()
+    flushed = collector.flush()
+    next(flushed)
+    yield from asyncio.sleep(.01)
+    assert not waiter.done()
+    next(flushed)
+    yield from asyncio.sleep(.01)
+    assert waiter.done()
+
+
+@pytest.mark.asyncio
+def test_client_drain(event_loop):
+    client = aiomeasures.Datadog('udp://127.0.0.1:0', flush_interval=10,
+                                 capacity=10, overflow='block')
+    client.start()
+    for i in range(20):
+        yield from client.drain()
+        client.incr('blocking')
+    assert client.dropped == 0
+    assert len(client.collector) <= 10
+    yield from client.aclose()
+
+
+def test_inbox_threads():
+    inbox = Inbox()
+    received = []
+
+    def produce(thread):
+        for i in range(10000):
+            inbox.append((thread, i))
+
+    threads = [threading.Thread(target=produce, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        received.extend(inbox.drain())
+    received.extend(inbox.drain())
+    assert sorted(received) == [(n, i) for n in range(8) for i in range(10000)]
+    assert not inbox
+    assert inbox.buffers == []
+
+
+def test_inbox_maxlen():
+    inbox = Inbox(2)
+    assert [inbox.append(i) for i in range(3)] == [1, 2, 0]
+    assert inbox.dropped == 1
+    assert inbox.drain() == [0, 1]
+
+
+def test_inbox_notify():
+    inbox = Inbox()
+    inbox.append(0)
+    assert inbox.notify()
+    inbox.append(1)
+    assert not inbox.notify()
+    assert inbox.drain() == [0, 1]
+    # appended while the loop drains, after the buffer has been read
+    inbox._local.buffer.append(2)
+    inbox.append(3)
+    assert inbox.notify()
+    assert inbox.drain() == [2, 3]
@@ -64,13 +64,13 @@ tags = [
 @pytest.mark.parametrize('tags,defaults,expected', tags)
 def test_tags(tags, defaults, expected):
     metric = aiomeasures.CountingMetric('foo', 1, tags=tags)
-    handler = aiomeasures.StatsD(':0', tags=defaults)
+    handler = aiomeasures.Datadog(':0', tags=defaults)
     assert handler.format(metric) == 'foo:1|c%s' % expected
 
 
 def test_events():
     event = aiomeasures.Event('Man down!', 'This server needs assistance.')
-    handler = aiomeasures.StatsD(':0')
+    handler = aiomeasures.Datadog(':0')
     assert handler.format(event) == '_e{9,29}Man down!|This server needs assistance.'
 
 checks = [
@@ -125,6 +125,15 @@ def test_client_event(event_loop):
     client.close()
 
 
+@pytest.mark.asyncio
+def test_client_check(udp_server):
+    client = aiomeasures.Datadog(udp_server.address)
+    client.check('srv', 'OK', message='fine')
+    yield from asyncio.sleep(.1)
+    assert udp_server.msg == ['_sc|srv|0|m:fine']
+    client.close()
+
+
 @pytest.mark.asyncio
 def test_client(event_loop):
     transport, protocol, port = yield from fake_server(event_loop)
@@ -0,0 +1,28 @@
+import aiomeasures
+import os.path
+import pytest
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+                    reason='modules define __getattr__ since python 3.7')
+def test_lazy_import():
+    script = ('import sys, aiomeasures; '
+              'print(sorted(name for name in sys.modules '
+              'if name.startswith(("aiomeasures", "asyncio", "subprocess"))))')
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.check_output([sys.executable, '-S', '-c', script],
+                                     env=env, universal_newlines=True)
+    assert output.strip() == "['aiomeasures', 'aiomeasures.util']"
+
+
+def test_attributes():
+    assert set(aiomeasures.__all__) <= set(dir(aiomeasures))
+    for name in aiomeasures.__all__:
+        assert getattr(aiomeasures, name).__name__ == name
+    assert isinstance(aiomeasures.__version__, str)
+    with pytest.raises(AttributeError):
+        aiomeasures.missing
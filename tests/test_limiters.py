@@ -0,0 +1,79 @@
+import pytest
+from aiomeasures import CardinalityLimiter, CountingMetric, Datadog
+from aiomeasures import Event, HyperLogLog, TagSet
+
+
+def test_max_tags():
+    limiter = CardinalityLimiter(max_tags=3)
+    metrics = [CountingMetric('hits', 1, tags={'id': i}) for i in range(10)]
+    admitted = [limiter.limit(metric) for metric in metrics]
+    assert [metric.tags for metric in admitted[:3]] == [
+        {'id': 0}, {'id': 1}, {'id': 2}]
+    assert all(metric.tags is TagSet(['__overflow__'])
+               for metric in admitted[3:])
+    assert limiter.folded == 7
+    assert all(a is m for a, m in zip(admitted[:3], metrics[:3]))
+    assert [metric.tags for metric in metrics[3:]] == [
+        {'id': i} for i in range(3, 10)]
+    # known series still pass
+    assert limiter.limit(CountingMetric('hits', 1, tags=['id:1'])).tags == [
+        'id:1']
+    # estimated once the name overflows
+    assert 9 <= limiter.estimate('hits') <= 11
+    assert limiter.estimate('other') == 0
+    assert len(limiter) == 3
+
+
+def test_max_series():
+    limiter = CardinalityLimiter(max_tags=None, max_series=2)
+    assert limiter.limit(CountingMetric('a', 1))
+    assert limiter.limit(CountingMetric('b', 1, tags=['x']))
+    assert limiter.limit(CountingMetric('c', 1)) is None
+    assert limiter.rejected == 1
+    folded = limiter.limit(CountingMetric('b', 1, tags=['y']))
+    assert folded.tags is TagSet(['__overflow__'])
+    assert limiter.folded == 1
+
+    limiter.clear()
+    assert limiter.limit(CountingMetric('c', 1)).tags is None
+
+
+def test_events():
+    limiter = CardinalityLimiter(max_series=0)
+    event = Event('title', 'text')
+    assert limiter.limit(event) is event
+
+
+@pytest.mark.parametrize('count', [10, 1000, 100000])
+def test_hyperloglog(count):
+    hll = HyperLogLog(12)
+    for i in range(count):
+        hll.add(i)
+        hll.add(i)
+    assert abs(len(hll) - count) <= 0.05 * count
+
+    with pytest.raises(ValueError):
+        HyperLogLog(2)
+
+
+def test_client():
+    client = Datadog(':0', flush_interval=60,
+                     limiter=CardinalityLimiter(max_tags=2, max_series=3))
+    for i in range(5):
+        client.incr('requests', tags={'request_id': i})
+    client.incr('other')
+    assert client.incr('rejected') is None
+    client.histogram_many('sizes', [1, 2])
+    lines = [line for item in client.collector.flush(formatter=client.format)
+             for line in item.split('\n')]
+    assert lines == [
+        'requests:1|c|#request_id:0',
+        'requests:1|c|#request_id:1',
+        'requests:1|c|#__overflow__',
+        'requests:1|c|#__overflow__',
+        'requests:1|c|#__overflow__',
+        'other:1|c',
+    ]
+    stats = client.stats()
+    assert stats['series_folded'] == 3
+    assert stats['series_rejected'] == 2
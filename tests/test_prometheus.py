@@ -0,0 +1,171 @@
+import asyncio
+import pytest
+import threading
+from aiomeasures import CountingMetric, Prometheus, TagSet, TimingMetric
+
+
+def test_render(event_loop):
+    client = Prometheus(':0', prefix='app', tags={'env': 'prod'})
+    client.incr('hits', tags={'route': '/users'})
+    client.incr('hits', 3, tags={'route': '/users'})
+    # kept at a rate of 0.5, it stands for 2 hits
+    client.register(CountingMetric('hits', 1, rate=0.5,
+                                   tags=TagSet({'route': '/'})))
+    client.gauge('pool.size', 3)
+    client.gauge('pool.size', -1, delta=True)
+    client.timing('latency', 7)
+    client.histogram('latency', 700)
+    client.set('users', 'bob')
+    client.event('deployed', 'v1')
+    client.counter_handle('jobs', tags=['fast']).incr(2)
+    assert client.render().decode().split('\n') == [
+        '# TYPE app_hits counter',
+        'app_hits_total{env="prod",route="/users"} 4',
+        'app_hits_total{env="prod",route="/"} 2.0',
+        '# TYPE app_pool_size gauge',
+        'app_pool_size{env="prod"} 2',
+        '# TYPE app_latency histogram',
+        'app_latency_bucket{env="prod",le="5.0"} 0',
+        'app_latency_bucket{env="prod",le="10.0"} 1',
+        'app_latency_bucket{env="prod",le="25.0"} 1',
+        'app_latency_bucket{env="prod",le="50.0"} 1',
+        'app_latency_bucket{env="prod",le="100.0"} 1',
+        'app_latency_bucket{env="prod",le="250.0"} 1',
+        'app_latency_bucket{env="prod",le="500.0"} 1',
+        'app_latency_bucket{env="prod",le="1000.0"} 2',
+        'app_latency_bucket{env="prod",le="2500.0"} 2',
+        'app_latency_bucket{env="prod",le="5000.0"} 2',
+        'app_latency_bucket{env="prod",le="10000.0"} 2',
+        'app_latency_bucket{env="prod",le="+Inf"} 2',
+        'app_latency_count{env="prod"} 2',
+        'app_latency_sum{env="prod"} 707',
+        '# TYPE app_jobs counter',
+        'app_jobs_total{env="prod",fast="true"} 2',
+        '# EOF',
+        '',
+    ]
+    stats = client.stats()
+    assert stats['ignored'] == 2
+    assert stats['series'] == 5
+
+
+def test_conflicts(event_loop):
+    client = Prometheus(':0')
+    client.incr('foo')
+    client.gauge('foo', 1)
+    assert client.stats()['conflicts'] == 1
+    assert client.render() == b'# TYPE foo counter\nfoo_total 1\n# EOF\n'
+
+
+def test_exposed_names(event_loop):
+    client = Prometheus(':0', prefix='app')
+    client.incr('req.count')
+    client.incr('req_count')
+    client.gauge('req-count', 1)
+    assert client.render() == (b'# TYPE app_req_count counter\n'
+                               b'app_req_count_total 2\n# EOF\n')
+    assert client.stats()['conflicts'] == 1
+
+
+def test_monotonic_counters(event_loop):
+    client = Prometheus(':0')
+    client.incr('jobs', 3)
+    client.decr('jobs')
+    client.counter_handle('jobs').decr(2)
+    assert client.render() == b'# TYPE jobs counter\njobs_total 3\n# EOF\n'
+    assert client.stats()['ignored'] == 2
+
+
+def test_sampled_histograms(event_loop):
+    client = Prometheus(':0', buckets=[10])
+    client.register(TimingMetric('latency', 7, rate=0.5))
+    client.register(TimingMetric('latency', 20, rate=0.25))
+    assert client.render().decode().split('\n') == [
+        '# TYPE latency histogram',
+        'latency_bucket{le="10.0"} 2',
+        'latency_bucket{le="+Inf"} 6',
+        'latency_count 6',
+        'latency_sum 94.0',
+        '# EOF',
+        '',
+    ]
+
+
+@pytest.mark.asyncio
+def test_threads(event_loop):
+    client = Prometheus(':0', loop=event_loop)
+
+    def produce():
+        for i in range(1000):
+            client.incr('hits')
+
+    threads = [threading.Thread(target=produce) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # only the loop updates the series, scrapes taking what is buffered
+    assert not client.registry.families
+    assert b'hits_total 4000\n' in client.render()
+
+    thread = threading.Thread(target=produce)
+    thread.start()
+    thread.join()
+    yield from asyncio.sleep(.01)
+    assert not client.inbox
+    assert b'hits_total 5000\n' in client.render()
+
+
+def test_escape(event_loop):
+    client = Prometheus(':0')
+    metric = CountingMetric('1st-hit', 1, tags={'path': 'a"b\\c\n', 'x-y': 1})
+    assert client.format(metric) == (
+        '# TYPE _1st_hit counter\n'
+        '_1st_hit_total{path="a\\"b\\\\c\\n",x_y="1"} 1\n'
+        '# EOF\n')
+    assert not client.registry.families
+
+
+def test_cached_chunks(event_loop):
+    client = Prometheus(':0')
+    client.incr('a')
+    client.incr('b')
+    client.render()
+    a = client.registry.families['a'].series[None]
+    b = client.registry.families['b'].series[None]
+    chunk = b.chunk
+    client.incr('a')
+    assert a.chunk is None
+    assert b'a_total 2\n' in client.render()
+    assert b.chunk is chunk
+
+
+@asyncio.coroutine
+def fetch(port, request):
+    reader, writer = yield from asyncio.open_connection('127.0.0.1', port)
+    writer.write(request)
+    response = yield from reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return head.split(b'\r\n'), body
+
+
+@pytest.mark.asyncio
+def test_scrape(event_loop):
+    client = Prometheus('http://127.0.0.1:0')
+    client.incr('hits')
+    client.start()
+    yield from asyncio.sleep(.01)
+    head, body = yield from fetch(
+        client.port, b'GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    assert head[0] == b'HTTP/1.1 200 OK'
+    assert (b'Content-Type: application/openmetrics-text; version=1.0.0; '
+            b'charset=utf-8') in head
+    assert body == b'# TYPE hits counter\nhits_total 1\n# EOF\n'
+
+    head, body = yield from fetch(client.port, b'GET / HTTP/1.0\r\n\r\n')
+    assert head[0] == b'HTTP/1.1 404 Not Found'
+    head, body = yield from fetch(client.port, b'POST /metrics HTTP/1.0\n\n')
+    assert head[0] == b'HTTP/1.1 405 Method Not Allowed'
+    assert client.stats()['scrapes'] == 1
+    yield from client.aclose()
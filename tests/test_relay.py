@@ -0,0 +1,128 @@
+import asyncio
+import os
+import os.path
+import pytest
+import socket
+from aiomeasures import Aggregator, Datadog, forks
+from aiomeasures.relay import Relay, parse_line
+
+
+@pytest.mark.parametrize('line', [
+    'foo:1|c',
+    'foo:1.5|c|@0.1',
+    'foo:-1|c|#a:b,c',
+    'foo:42|g',
+    'foo:+3|g|#a:b',
+    'foo:-3|g',
+    'foo:bar|s|#a:b',
+    'foo:12|h',
+    'foo:100|ms|@0.5',
+])
+def test_parse(line):
+    assert str(Datadog(':0').format(parse_line(line))) == line
+
+
+@pytest.mark.parametrize('line', [
+    '_e{5,4}title|text',
+    '_sc|check|0',
+    'foo:1:2|h',
+    'foo:1|d',
+    'foo:1|c|T1656581400',
+    'foo|c',
+    'foo:|c',
+])
+def test_parse_unsupported(line):
+    assert parse_line(line) is None
+
+
+def test_parse_delta():
+    assert parse_line('foo:+3|g').delta
+    assert parse_line('foo:-3|g').delta
+    assert not parse_line('foo:3|g').delta
+    assert not parse_line('foo:-3|c').delta
+
+
+@pytest.mark.asyncio
+def test_relay(event_loop, tmpdir, udp_server):
+    upstream = udp_server.address
+    path = os.path.join(str(tmpdir), 'relay.sock')
+    relay = Relay('unix://%s' % path, upstream, interval=60,
+                  aggregator=Aggregator(), loop=event_loop)
+    yield from relay.start()
+
+    workers = [Datadog('unix://%s' % path, flush_interval=60)
+               for i in range(4)]
+    for worker in workers:
+        for i in range(100):
+            worker.incr('requests', tags={'route': 'index'})
+        worker.gauge('pool', 10)
+        worker.histogram('size', 42)
+        worker.event('deployed', 'v1')
+        yield from worker.aclose()
+    yield from asyncio.sleep(.05)
+    assert relay.received == 4 * 103
+
+    yield from relay.aclose()
+    yield from asyncio.sleep(.05)
+    assert not os.path.exists(path)
+    assert sorted(udp_server.msg) == sorted(
+        ['requests:400|c|#route:index', 'pool:10|g']
+        + ['size:42|h'] * 4 + ['_e{8,2}deployed|v1'] * 4)
+
+
+@pytest.mark.skipif(not hasattr(os, 'register_at_fork'),
+                    reason='requires os.register_at_fork')
+def test_fork():
+    loop = asyncio.new_event_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.settimeout(1)
+    client = Datadog('udp://127.0.0.1:%s' % sock.getsockname()[1],
+                     loop=loop, flush_interval=60)
+    client.incr('parent')
+    loop.run_until_complete(client.reporter.connect())
+    parent_protocol = client.reporter.protocol
+
+    pid = os.fork()
+    if not pid:
+        # the child sends its own metrics over its own socket
+        code = 1
+        try:
+            if (client.reporter.protocol is None
+                    and not client.collector
+                    and client.flusher.task is None):
+                child_loop = asyncio.new_event_loop()
+                client.loop = client.reporter.loop = child_loop
+                client.incr('child')
+                child_loop.run_until_complete(client.send())
+                code = 0
+        finally:
+            os._exit(code)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert sock.recv(1024) == b'child:1|c\n'
+    assert client.reporter.protocol is parent_protocol
+    loop.run_until_complete(client.send())
+    assert sock.recv(1024) == b'parent:1|c\n'
+    client.close()
+    loop.close()
+    sock.close()
+
+
+def test_fork_check(monkeypatch):
+    # what clients do before python 3.7, without os.register_at_fork
+    monkeypatch.setattr(forks, 'check', forks.check_pid)
+    loop = asyncio.new_event_loop()
+    client = Datadog('udp://127.0.0.1:0', loop=loop, flush_interval=60)
+    client.incr('parent')
+    client.incr('parent')
+    assert client.registered == 2
+
+    monkeypatch.setattr(forks, '_pid', -1)
+    client.incr('child')
+    assert client.registered == 1
+    assert [metric.name for metric in client.collector] == ['child']
+    client.incr('child')
+    assert client.registered == 2
+    loop.close()
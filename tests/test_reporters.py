@@ -0,0 +1,337 @@
+import asyncio
+import os.path
+import pytest
+import socket
+from aiomeasures import Datadog, Event, TimingMetric
+from aiomeasures.reporters import StatsDReporter
+from aiomeasures.reporters.batching import Batch, available
+
+
+class FakeProtocol:
+
+    paused = False
+    closed = False
+
+    def __init__(self):
+        self.packets = []
+        self.batches = []
+
+    def send(self, msg):
+        self.packets.append(bytes(msg))
+
+    def send_batch(self, batch):
+        self.batches.append(len(batch))
+        self.packets.extend(bytes(packet) for packet in batch.packets())
+        batch.clear()
+
+
+def reporter(addr='udp://127.0.0.1:0', **kwargs):
+    loop = asyncio.new_event_loop()
+    reporter = StatsDReporter(addr, loop=loop, **kwargs)
+    reporter.protocol = FakeProtocol()
+    return reporter
+
+
+def send(reporter, lines):
+    reporter.loop.run_until_complete(reporter.send(lines))
+    reporter.loop.close()
+    return reporter.protocol.packets
+
+
+def test_default_sizes():
+    assert reporter('udp://127.0.0.1:0').max_packet_size == 1432
+    assert reporter('unix:///tmp/agent.sock').max_packet_size == 8192
+
+
+def test_packing():
+    lines = ['foo.%s:1|c' % i for i in range(1000)]
+    packets = send(reporter(max_packet_size=100), lines)
+    assert all(len(packet) <= 100 for packet in packets)
+    received = [line.decode() for packet in packets
+                for line in packet.split()]
+    assert received == lines
+    for packet, following in zip(packets, packets[1:]):
+        # greedy: the next line did not fit into the packet
+        assert len(packet) + len(following.split(b'\n')[0]) + 1 > 100
+
+
+def test_oversized_send():
+    lines = ['a:1|c', 'b' * 200 + ':1|c', 'c:1|c']
+    packets = send(reporter(max_packet_size=100), lines)
+    assert packets == [b'a:1|c\n', ('b' * 200 + ':1|c\n').encode(), b'c:1|c\n']
+
+
+def test_oversized_drop():
+    lines = ['a:1|c', 'b' * 200 + ':1|c', 'c:1|c']
+    instance = reporter(max_packet_size=100, oversized='drop')
+    packets = send(instance, lines)
+    assert packets == [b'a:1|c\n', b'c:1|c\n']
+    assert instance.dropped_lines == 1
+
+    with pytest.raises(ValueError):
+        reporter(oversized='split')
+
+
+def test_backpressure_drop():
+    instance = reporter(max_packet_size=10)
+    instance.protocol.paused = True
+    assert send(instance, ['a:1|c', 'b:1|c']) == []
+    assert instance.dropped_packets == 2
+
+
+def test_backpressure_closed():
+    instance = reporter(max_packet_size=10, backpressure='wait')
+    protocol = instance.protocol
+    protocol.paused = True
+
+    @asyncio.coroutine
+    def drain():
+        protocol.closed = True
+    protocol.drain = drain
+    assert send(instance, ['a:1|c', 'b:1|c']) == []
+    assert instance.dropped_packets == 1
+
+
+@asyncio.coroutine
+def fake_unix_server(event_loop, path):
+    class Protocol:
+
+        def __init__(self):
+            self.msg = []
+
+        def connection_made(self, transport):
+            self.transport = transport
+
+        def datagram_received(self, data, addr):
+            self.msg.extend(data.decode().split())
+
+        def connection_lost(self, *args):
+            pass
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(path)
+    transport, protocol = yield from event_loop.create_datagram_endpoint(
+        lambda: Protocol(),
+        sock=sock
+    )
+    return transport, protocol
+
+
+@pytest.mark.asyncio
+def test_unix(event_loop, tmpdir):
+    path = os.path.join(str(tmpdir), 'agent.sock')
+    transport, protocol = yield from fake_unix_server(event_loop, path)
+    client = Datadog('unix://%s' % path, flush_interval=.01)
+    assert client.reporter.max_packet_size == 8192
+    client.start()
+    for i in range(1000):
+        client.incr('unix.%s' % i)
+    yield from client.aclose()
+    yield from asyncio.sleep(.1)
+    assert protocol.msg == ['unix.%s:1|c' % i for i in range(1000)]
+    transport.close()
+
+
+@pytest.mark.asyncio
+def test_unix_datagrams(event_loop, tmpdir):
+    path = os.path.join(str(tmpdir), 'agent.sock')
+    transport, protocol = yield from fake_unix_server(event_loop, path)
+    instance = StatsDReporter('unix://%s' % path, max_packet_size=100,
+                              batch=0)
+    yield from instance.connect()
+    lines = ['unix.%s:1|c' % i for i in range(100)]
+    yield from instance.send(lines)
+    yield from asyncio.sleep(.05)
+    assert protocol.msg == lines
+    assert instance.connected
+    assert instance.send_errors == 0
+    instance.close()
+    transport.close()
+
+
+@pytest.mark.asyncio
+def test_unix_backpressure_wait(event_loop, tmpdir):
+    path = os.path.join(str(tmpdir), 'agent.sock')
+    transport, protocol = yield from fake_unix_server(event_loop, path)
+    instance = StatsDReporter('unix://%s' % path, backpressure='wait')
+    yield from instance.connect()
+    instance.protocol.pause_writing()
+    task = asyncio.Task(instance.send(['a:1|c']))
+    yield from asyncio.sleep(.05)
+    assert not task.done()
+    instance.protocol.resume_writing()
+    yield from task
+    yield from asyncio.sleep(.05)
+    assert protocol.msg == ['a:1|c']
+    assert instance.dropped_packets == 0
+    instance.close()
+    transport.close()
+
+
+@asyncio.coroutine
+def fake_tcp_server(event_loop, port=0):
+    class Protocol(asyncio.Protocol):
+
+        msg = []
+        transports = []
+
+        def connection_made(self, transport):
+            self.transports.append(transport)
+
+        def data_received(self, data):
+            self.msg.append(data)
+
+    server = yield from event_loop.create_server(
+        lambda: Protocol(), host='127.0.0.1', port=port)
+    port = server.sockets[0].getsockname()[1]
+    return server, Protocol, port
+
+
+def received(protocol):
+    return b''.join(protocol.msg).decode().split()
+
+
+@pytest.mark.asyncio
+def test_tcp(event_loop):
+    server, protocol, port = yield from fake_tcp_server(event_loop)
+    client = Datadog('tcp://127.0.0.1:%s' % port, flush_interval=.01)
+    assert client.reporter.max_packet_size == 65536
+    assert client.reporter.backpressure == 'wait'
+    client.start()
+    for i in range(5000):
+        client.incr('tcp.%s' % i)
+    yield from client.aclose()
+    yield from asyncio.sleep(.1)
+    assert received(protocol) == ['tcp.%s:1|c' % i for i in range(5000)]
+    server.close()
+
+
+@pytest.mark.asyncio
+def test_tcp_reconnect(event_loop):
+    server, protocol, port = yield from fake_tcp_server(event_loop)
+    client = Datadog('tcp://127.0.0.1:%s' % port)
+    client.reporter.min_backoff = .05
+    client.incr('before')
+    yield from asyncio.sleep(.1)
+    assert received(protocol) == ['before:1|c']
+
+    server.close()
+    for transport in protocol.transports:
+        transport.close()
+    yield from asyncio.sleep(.1)
+    assert not client.reporter.connected
+
+    client.incr('during')
+    yield from asyncio.sleep(.01)
+    assert len(client.collector) == 1
+
+    server, protocol, port = yield from fake_tcp_server(event_loop, port)
+    yield from asyncio.sleep(.1)
+    client.incr('after')
+    yield from asyncio.sleep(.1)
+    assert received(protocol) == ['during:1|c', 'after:1|c']
+    client.close()
+    server.close()
+
+
+@pytest.mark.asyncio
+def test_tcp_write_buffer_limits(event_loop):
+    server, protocol, port = yield from fake_tcp_server(event_loop)
+    instance = StatsDReporter('tcp://127.0.0.1:%s' % port,
+                              high_water=1024, low_water=512)
+    yield from instance.connect()
+    transport = instance.protocol.transport
+    assert transport.get_write_buffer_limits() == (512, 1024)
+    instance.close()
+    server.close()
+
+
+def test_batches():
+    batch = '\n'.join('foo:%s|h' % i for i in range(100))
+    packets = send(reporter(max_packet_size=100), ['a:1|c', batch, 'b:1|c'])
+    assert all(len(packet) <= 100 for packet in packets)
+    received = [line.decode() for packet in packets
+                for line in packet.split()]
+    assert received == ['a:1|c'] + batch.split() + ['b:1|c']
+
+
+def test_encoded():
+    client = Datadog(':0', tags={'env': 'test'})
+    metrics = [TimingMetric('foo.%s' % (i % 7), i, tags={'i': i % 3})
+               for i in range(1000)] + [Event('title', 'text')]
+    instance = reporter(max_packet_size=200)
+    packets = [bytes(packet) for packet in
+               instance.pack(client.encode(metric) for metric in metrics)]
+    expected = [bytes(packet) for packet in
+                instance.pack(client.format(metric) for metric in metrics)]
+    assert packets == expected
+    assert all(len(packet) <= 200 for packet in packets)
+    received = [line.decode() for packet in packets
+                for line in packet.split()]
+    assert received == [client.format(metric) for metric in metrics]
+
+
+def test_reused_buffer():
+    instance = reporter(max_packet_size=100)
+    lines = [(b'foo:', b'%d' % i, b'|c\n') for i in range(100)]
+    buffers = {id(packet.obj) for packet in instance.pack(lines)}
+    assert len(buffers) == 1
+    assert buffers == {id(packet.obj) for packet in instance.pack(lines)}
+
+
+def test_encoded_oversized():
+    line = (b'a' * 200 + b':', b'1', b'|c\n')
+    packets = send(reporter(max_packet_size=100),
+                   [line, (b'b:', b'1', b'|c\n')])
+    assert packets == [b'a' * 200 + b':1|c\n', b'b:1|c\n']
+
+
+def test_batched():
+    lines = ['foo.%s:1|c' % i for i in range(10)]
+    lines.insert(5, 'b' * 200 + ':1|c')
+    instance = reporter(max_packet_size=10, batch=4)
+    packets = send(instance, lines)
+    assert packets == [('%s\n' % line).encode() for line in lines]
+    # the oversized line flushes the pending batch and goes alone
+    assert instance.protocol.batches == [4, 1, 4, 1]
+    assert instance.packets_sent == 11
+
+    with pytest.raises(ValueError):
+        reporter('tcp://127.0.0.1:0', batch=4)
+
+
+def test_batch_disabled():
+    instance = reporter(max_packet_size=6, batch=0)
+    assert send(instance, ['a:1|c', 'b:1|c']) == [b'a:1|c\n', b'b:1|c\n']
+    assert instance.protocol.batches == []
+
+
+@pytest.mark.skipif(not available, reason='requires sendmmsg')
+def test_sendmmsg():
+    receiver, sender = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    batch = Batch(100, 8)
+    for i in range(5):
+        assert not batch.append(b'foo.%d:1|c\n' % i)
+    assert batch.send(sender.fileno(), 2) == 3
+    assert [receiver.recv(100) for i in range(3)] == [
+        b'foo.2:1|c\n', b'foo.3:1|c\n', b'foo.4:1|c\n']
+    receiver.close()
+    with pytest.raises(OSError):
+        batch.send(sender.fileno())
+    sender.close()
+
+
+@pytest.mark.asyncio
+def test_unix_batched(event_loop, tmpdir):
+    path = os.path.join(str(tmpdir), 'agent.sock')
+    transport, protocol = yield from fake_unix_server(event_loop, path)
+    instance = StatsDReporter('unix://%s' % path, max_packet_size=100,
+                              batch=8)
+    yield from instance.connect()
+    lines = ['unix.%s:1|c' % i for i in range(1000)]
+    yield from instance.send(lines)
+    yield from asyncio.sleep(.1)
+    assert protocol.msg == lines
+    assert instance.send_errors == 0
+    instance.close()
+    transport.close()
@@ -0,0 +1,39 @@
+import aiomeasures
+import random
+from datetime import timedelta
+
+
+class Recorder(aiomeasures.Datadog):
+
+    def register(self, metric):
+        self.collector.append(metric)
+        return metric
+
+
+def test_sampled_at_call_site():
+    random.seed(42)
+    client = Recorder(':0', capacity=None)
+    for i in range(10000):
+        client.incr('foo', rate=0.01)
+        client.timing('bar', 10, rate=0.5)
+        client.incr('baz')
+    counts = {}
+    for metric in client.collector:
+        counts[metric.name] = counts.get(metric.name, 0) + 1
+    assert 50 <= counts['foo'] <= 150
+    assert 4800 <= counts['bar'] <= 5200
+    assert counts['baz'] == 10000
+
+
+def test_sampled_out_returns_none():
+    client = Recorder(':0')
+    assert client.incr('foo', rate=0) is None
+    assert client.gauge('foo', 1, rate=0.0) is None
+    assert client.incr('foo', rate=1) is not None
+    assert not client.collector.dropped
+
+
+def test_non_probability_rates():
+    client = Recorder(':0')
+    for i in range(100):
+        assert client.incr('foo', rate=timedelta(microseconds=20000))
@@ -0,0 +1,95 @@
+import aiomeasures
+import pytest
+from aiomeasures import Aggregator, Sketch, TimingMetric
+from random import Random
+
+quantiles = [0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 0.999, 1]
+
+
+def exact(values, q):
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))]
+
+
+@pytest.mark.parametrize('accuracy', [0.01, 0.05])
+@pytest.mark.parametrize('distribution', ['lognormal', 'uniform', 'mixed'])
+def test_accuracy(accuracy, distribution):
+    rand = Random(42)
+    if distribution == 'lognormal':
+        values = [rand.lognormvariate(3, 1.5) for i in range(20000)]
+    elif distribution == 'uniform':
+        values = [rand.uniform(0, 1000) for i in range(20000)]
+    else:
+        values = [rand.gauss(0, 100) for i in range(20000)]
+    sketch = Sketch(accuracy)
+    sketch.update(values)
+    assert sketch.count == len(values)
+    assert sketch.min == min(values)
+    assert sketch.max == max(values)
+    assert sketch.avg == pytest.approx(sum(values) / len(values))
+    for q in quantiles:
+        expected = exact(values, q)
+        assert abs(sketch.quantile(q) - expected) <= accuracy * abs(expected)
+
+
+def test_merge():
+    rand = Random(42)
+    values = [rand.expovariate(0.1) for i in range(10000)]
+    a, b, whole = Sketch(), Sketch(), Sketch()
+    a.update(values[:3000])
+    b.update(values[3000:])
+    whole.update(values)
+    a.merge(b)
+    assert a.count == whole.count
+    assert a.min == whole.min
+    assert a.max == whole.max
+    for q in quantiles:
+        assert a.quantile(q) == whole.quantile(q)
+
+    with pytest.raises(ValueError):
+        a.merge(Sketch(0.05))
+
+
+def test_bounded_memory():
+    sketch = Sketch(0.01, max_bins=64)
+    value = 1.0
+    for i in range(10000):
+        sketch.add(value)
+        sketch.add(-value)
+        value *= 1.01
+    assert len(sketch.positives) <= 64
+    assert len(sketch.negatives) <= 64
+    expected = exact([1.01 ** i for i in range(10000)], 0.99)
+    assert abs(sketch.quantile(0.995) - expected) <= 0.01 * expected
+
+
+def test_aggregator():
+    aggregator = Aggregator(sketches=True, percentiles=(0.5, 0.999))
+    for value in range(1, 1001):
+        assert aggregator.add(TimingMetric('foo', value, tags=['a:b']))
+    assert len(aggregator) == 1
+    handler = aiomeasures.Datadog(':0')
+    lines = [handler.format(metric) for metric in aggregator.flush()]
+    assert lines[:3] == [
+        'foo.count:1000|c|#a:b',
+        'foo.min:1|g|#a:b',
+        'foo.max:1000|g|#a:b',
+    ]
+    assert lines[3] == 'foo.avg:500.5|g|#a:b'
+    name, _, value = lines[4].partition('|')[0].partition(':')
+    assert name == 'foo.p50'
+    assert abs(float(value) - 500) <= 5
+    assert lines[5].startswith('foo.p99.9:')
+    assert not len(aggregator)
+
+
+def test_update():
+    rand = Random(42)
+    values = [rand.normalvariate(0, 100) for i in range(10000)] + [0] * 10
+    added, updated = Sketch(max_bins=128), Sketch(max_bins=128)
+    for value in values:
+        added.add(value)
+    updated.update(iter(values))
+    for attr in ('positives', 'negatives', 'zeros', 'count', 'min', 'max'):
+        assert getattr(updated, attr) == getattr(added, attr)
+    assert abs(updated.sum - added.sum) < 1e-6
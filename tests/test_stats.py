@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from aiomeasures import Aggregator, Datadog
+
+
+@pytest.mark.asyncio
+def test_stats(event_loop, udp_server):
+    client = Datadog(udp_server.address, flush_interval=60, capacity=5,
+                     aggregator=Aggregator(), overflow='drop_newest')
+    client.incr('hits')
+    client.incr('hits')
+    client.incr('never', rate=0)
+    client.histogram_many('sizes', [1, 2, 3], rate=0)
+    for i in range(7):
+        client.timing('duration', i)
+    yield from client.send()
+    yield from client.send()
+    yield from asyncio.sleep(.05)
+    # the aggregated counter finds no room either
+    assert len(udp_server.msg) == 5
+
+    stats = client.stats()
+    assert stats['registered'] == 9
+    assert stats['sampled_out'] == 4
+    assert stats['aggregated'] == 2
+    assert stats['dropped'] == 3
+    assert stats['pending'] == 0
+    assert stats['formatted'] == 5
+    assert stats['packets_sent'] == 1
+    assert stats['bytes_sent'] == len('\n'.join(udp_server.msg)) + 1
+    assert stats['send_errors'] == 0
+    assert stats['flushes'] == 2
+    assert stats['empty_flushes'] == 1
+    assert 0 < stats['flush_latency.p50'] <= stats['flush_latency.max']
+
+    client.reporter.protocol.error_received(OSError('refused'))
+    assert client.stats()['send_errors'] == 1
+    client.close()
+
+
+@pytest.mark.asyncio
+def test_connect_errors(event_loop, tmpdir):
+    client = Datadog('unix://%s/missing.sock' % tmpdir)
+    client.incr('hits')
+    yield from asyncio.sleep(.05)
+    assert client.stats()['connect_errors'] == 1
+    assert client.stats()['pending'] == 1
+
+
+@pytest.mark.asyncio
+def test_telemetry(event_loop, udp_server):
+    client = Datadog(udp_server.address, flush_interval=60, prefix='app',
+                     telemetry='aiomeasures', telemetry_interval=0)
+    client.incr('hits')
+    yield from client.send()
+    yield from asyncio.sleep(.05)
+    assert 'app.hits:1|c' in udp_server.msg
+    assert 'app.aiomeasures.registered:1|c' in udp_server.msg
+    assert 'app.aiomeasures.pending:1|g' in udp_server.msg
+
+    del udp_server.msg[:]
+    yield from client.send()
+    yield from asyncio.sleep(.05)
+    # only what changed since the previous report
+    reported = {line.split(':')[0] for line in udp_server.msg}
+    assert 'app.aiomeasures.registered' not in reported
+    assert 'app.aiomeasures.packets_sent' in reported
+    assert 'app.aiomeasures.flush_latency.p50' in reported
+    client.close()
@@ -8,8 +8,8 @@ simple = [
     (aiomeasures.CountingMetric('foo', -1), 'foo:-1|c'),
     (aiomeasures.GaugeMetric('foo', 1), 'foo:1|g'),
     (aiomeasures.GaugeMetric('foo', -1), 'foo:-1|g'),
-    (aiomeasures.HistogramMetric('foo', 42), 'foo:42|h'),
-    (aiomeasures.HistogramMetric('foo', -42), 'foo:-42|h'),
+    (aiomeasures.HistogramMetric('foo', 42), 'foo:42|ms'),
+    (aiomeasures.HistogramMetric('foo', -42), 'foo:-42|ms'),
     (aiomeasures.SetMetric('foo', 'bar'), 'foo:bar|s'),
     (aiomeasures.TimingMetric('foo', 100), 'foo:100|ms'),
 ]
@@ -22,32 +22,35 @@ rated = [
     (aiomeasures.GaugeMetric('foo', 1, 0.1), 'foo:1|g|@0.1'),
     (aiomeasures.SetMetric('foo', 'bar', 0.1), 'foo:bar|s|@0.1'),
     (aiomeasures.TimingMetric('foo', 100, 0.1), 'foo:100|ms|@0.1'),
-    (aiomeasures.HistogramMetric('foo', -42, 0.1), 'foo:-42|h|@0.1'),
+    (aiomeasures.HistogramMetric('foo', -42, 0.1), 'foo:-42|ms|@0.1'),
 
     (aiomeasures.CountingMetric('foo', 1, one_second), 'foo:1|c|@1'),
     (aiomeasures.GaugeMetric('foo', 1, one_second), 'foo:1|g|@1'),
     (aiomeasures.SetMetric('foo', 'bar', one_second), 'foo:bar|s|@1'),
     (aiomeasures.TimingMetric('foo', 100, one_second), 'foo:100|ms|@1'),
-    (aiomeasures.HistogramMetric('foo', -42, one_second), 'foo:-42|h|@1'),
+    (aiomeasures.HistogramMetric('foo', -42, one_second), 'foo:-42|ms|@1'),
 
     (aiomeasures.CountingMetric('foo', 1, twenty_ms), 'foo:1|c|@0.02'),
     (aiomeasures.GaugeMetric('foo', 1, twenty_ms), 'foo:1|g|@0.02'),
     (aiomeasures.SetMetric('foo', 'bar', twenty_ms), 'foo:bar|s|@0.02'),
     (aiomeasures.TimingMetric('foo', 100, twenty_ms), 'foo:100|ms|@0.02'),
-    (aiomeasures.HistogramMetric('foo', -42, twenty_ms), 'foo:-42|h|@0.02'),
+    (aiomeasures.HistogramMetric('foo', -42, twenty_ms), 'foo:-42|ms|@0.02'),
 ]
 
+bar_baz = {'bar': 'baz'}
+
 tagged = [
-    (aiomeasures.CountingMetric('foo', 1, tags={'bar': 'baz'}), 'foo:1|c|#bar:baz'),
-    (aiomeasures.CountingMetric('foo', -1, tags={'bar': 'baz'}), 'foo:-1|c|#bar:baz'),
-    (aiomeasures.GaugeMetric('foo', 1, tags={'bar': 'baz'}), 'foo:1|g|#bar:baz'),
-    (aiomeasures.GaugeMetric('foo', -1, tags={'bar': 'baz'}), 'foo:-1|g|#bar:baz'),
-    (aiomeasures.SetMetric('foo', 'bar', tags={'bar': 'baz'}), 'foo:bar|s|#bar:baz'),
-    (aiomeasures.TimingMetric('foo', 100, tags={'bar': 'baz'}), 'foo:100|ms|#bar:baz'),
+    (aiomeasures.CountingMetric('foo', 1, tags=bar_baz), 'foo;bar=baz:1|c'),
+    (aiomeasures.CountingMetric('foo', -1, tags=bar_baz), 'foo;bar=baz:-1|c'),
+    (aiomeasures.GaugeMetric('foo', 1, tags=bar_baz), 'foo;bar=baz:1|g'),
+    (aiomeasures.GaugeMetric('foo', -1, tags=bar_baz), 'foo;bar=baz:-1|g'),
+    (aiomeasures.SetMetric('foo', 'bar', tags=bar_baz), 'foo;bar=baz:bar|s'),
+    (aiomeasures.TimingMetric('foo', 100, tags=bar_baz), 'foo;bar=baz:100|ms'),
 ]
 
 whole = simple + rated + tagged
 
+
 @pytest.mark.parametrize('metric,expected', whole)
 def test_formatting(metric, expected):
     handler = aiomeasures.StatsD(':0')
@@ -56,40 +59,67 @@ def test_formatting(metric, expected):
 
 tags = [
     ({}, {}, ''),
-    ({'bar': 'baz'}, {}, '|#bar:baz'),
-    ({}, {'bar': 'baz'}, '|#bar:baz'),
-    ({'bar': 'baz'}, {'bar': 'qux'}, '|#bar:baz,bar:qux'),
+    ({'bar': 'baz'}, {}, ';bar=baz'),
+    ({}, {'bar': 'baz'}, ';bar=baz'),
+    ({'bar': 'baz'}, {'bar': 'qux'}, ';bar=baz;bar=qux'),
+    (['flag', 'a b:c;d'], {}, ';a_b=c_d;flag=true'),
 ]
 
+
 @pytest.mark.parametrize('tags,defaults,expected', tags)
 def test_tags(tags, defaults, expected):
     metric = aiomeasures.CountingMetric('foo', 1, tags=tags)
     handler = aiomeasures.StatsD(':0', tags=defaults)
-    assert handler.format(metric) == 'foo:1|c%s' % expected
+    assert handler.format(metric) == 'foo%s:1|c' % expected
+
+
+mangled = [
+    ('graphite', 'app.foo;a=b;flag=true:1|c'),
+    ('dotted', 'app.foo.a.b.flag:1|c'),
+    ('drop', 'app.foo:1|c'),
+    (lambda name, tags: '%s.%s' % (name, len(tags)), 'app.foo.2:1|c'),
+]
+
+
+@pytest.mark.parametrize('mangle,expected', mangled)
+def test_mangle(mangle, expected):
+    metric = aiomeasures.CountingMetric('foo', 1, tags=['a:b', 'flag'])
+    handler = aiomeasures.StatsD(':0', prefix='app', mangle=mangle)
+    assert handler.format(metric) == expected
+
+    with pytest.raises(ValueError):
+        aiomeasures.StatsD(':0', mangle='unknown')
 
 
 def test_events():
     event = aiomeasures.Event('Man down!', 'This server needs assistance.')
     handler = aiomeasures.StatsD(':0')
-    assert handler.format(event) == '_e{9,29}Man down!|This server needs assistance.'
+    with pytest.raises(ValueError):
+        handler.format(event)
+    assert handler.event('Man down!', 'This server needs assistance.') is None
+    assert not handler.collector
+
 
 checks = [
-    (aiomeasures.Check('srv', 'OK'), '_sc|srv|0'),
-    (aiomeasures.Check('srv', 'warning'), '_sc|srv|1'),
-    (aiomeasures.Check('srv', 'crit'), '_sc|srv|2'),
-    (aiomeasures.Check('srv', 'UNKNOWN'), '_sc|srv|3'),
-    (aiomeasures.Check('srv', 'OK', tags={'foo': 'bar'}, message='baz'), '_sc|srv|0|#foo:bar|m:baz'),
+    aiomeasures.Check('srv', 'OK'),
+    aiomeasures.Check('srv', 'warning'),
+    aiomeasures.Check('srv', 'OK', tags={'foo': 'bar'}, message='baz'),
 ]
 
-@pytest.mark.parametrize('check,expected', checks)
-def test_checks(check,expected):
+
+@pytest.mark.parametrize('check', checks)
+def test_checks(check):
     handler = aiomeasures.StatsD(':0')
-    assert handler.format(check) == expected
+    with pytest.raises(ValueError):
+        handler.format(check)
+    assert handler.check(check.name, check.status) is None
+    assert not handler.collector
 
 
 @asyncio.coroutine
 def fake_server(event_loop, port=None):
     port = port or 0
+
     class Protocol:
 
         msg = []
@@ -119,8 +149,11 @@ def test_client_event(event_loop):
     client = aiomeasures.StatsD('udp://127.0.0.1:%s' % port)
     asyncio.sleep(.4)
     client.event('title', 'text')
+    client.register(aiomeasures.Event('title', 'text'))
+    client.incr('after')
     yield from asyncio.sleep(.1)
-    assert '_e{5,4}title|text' in protocol.msg
+    assert '_e{5,4}title|text' not in protocol.msg
+    assert 'after:1|c' in protocol.msg
     transport.close()
     client.close()
 
@@ -144,7 +177,7 @@ def test_client(event_loop):
     assert 'example.d:bar|s' in protocol.msg
     assert 'example.e:-1|c' in protocol.msg
     assert 'example.f:42|c' in protocol.msg
-    assert 'example.g:13|h' in protocol.msg
+    assert 'example.g:13|ms' in protocol.msg
     transport.close()
     client.close()
 
@@ -0,0 +1,45 @@
+import pickle
+import pytest
+from aiomeasures import Aggregator, CountingMetric, Datadog, StatsD, TagSet
+
+
+def test_interned():
+    tags = TagSet({'b': 2, 'a': 1})
+    assert tags is TagSet(['a:1', 'b:2'])
+    assert tags is TagSet(tags)
+    assert tags == frozenset(['a:1', 'b:2'])
+    assert tags.sorted == ('a:1', 'b:2')
+    assert tags.text == 'a:1,b:2'
+    assert tags.encoded == b'a:1,b:2'
+    assert TagSet('a:1').sorted == ('a:1',)
+    assert TagSet().sorted == ()
+    assert pickle.loads(pickle.dumps(tags)) is tags
+
+
+def test_merge():
+    tags = TagSet({'b': 2})
+    merged = tags.merge({'a': 1})
+    assert merged.sorted == ('a:1', 'b:2')
+    assert tags.merge(TagSet({'a': 1})) is merged
+    assert tags.merge(None) is tags
+
+
+@pytest.mark.parametrize('cls,expected', [
+    (Datadog, 'foo:1|c|#env:prod,method:GET,route:index'),
+    (StatsD, 'foo;env=prod;method=GET;route=index:1|c'),
+])
+def test_format(cls, expected):
+    client = cls(':0', tags={'env': 'prod'})
+    tags = TagSet({'route': 'index', 'method': 'GET'})
+    for i in range(2):
+        assert client.format(CountingMetric('foo', 1, tags=tags)) == expected
+    plain = CountingMetric('foo', 1, tags={'route': 'index', 'method': 'GET'})
+    assert client.format(plain) == expected
+
+
+def test_series_key():
+    aggregator = Aggregator()
+    aggregator.add(CountingMetric('foo', 1, tags={'a': 'b'}))
+    aggregator.add(CountingMetric('foo', 2, tags=TagSet({'a': 'b'})))
+    aggregator.add(CountingMetric('foo', 3, tags=['a:b']))
+    assert [metric.value for metric in aggregator.flush()] == [6]
@@ -0,0 +1,68 @@
+import aiomeasures
+import pytest
+from aiomeasures import CountingMetric, Event, GaugeMetric, TimingMetric
+from aiomeasures.clients.formatting import DOGSTATSD, Dialect
+from aiomeasures.clients.templates import Templates
+
+
+def test_cached_series():
+    client = aiomeasures.Datadog(':0', prefix='app', tags={'env': 'prod'})
+    for value in (1, 2, 3):
+        metric = CountingMetric('foo', value, tags={'bar': 'baz'})
+        expected = 'app.foo:%s|c|#bar:baz,env:prod' % value
+        assert client.format(metric) == expected
+    assert len(client.templates) == 1
+
+    assert client.format(GaugeMetric('foo', 5, delta=True)) == \
+        'app.foo:+5|g|#env:prod'
+    assert client.format(GaugeMetric('foo', -5, delta=True)) == \
+        'app.foo:-5|g|#env:prod'
+    assert len(client.templates) == 2
+
+
+def test_invalidation():
+    client = aiomeasures.Datadog(':0', prefix='app')
+    metric = TimingMetric('foo', 10, rate=0.5)
+    assert client.format(metric) == 'app.foo:10|ms|@0.5'
+    client.prefix = 'other'
+    assert client.format(metric) == 'other.foo:10|ms|@0.5'
+    client.tags = ['a:b']
+    assert client.format(metric) == 'other.foo:10|ms|@0.5|#a:b'
+
+
+def test_lru():
+    client = aiomeasures.StatsD(':0', cache_size=10)
+    for i in range(100):
+        client.format(CountingMetric('foo.%s' % i, 1))
+    assert len(client.templates) == 10
+    assert ('c', 'foo.99', None, None) in client.templates.cache
+    assert ('c', 'foo.0', None, None) not in client.templates.cache
+
+
+def test_uncacheable():
+    client = aiomeasures.Datadog(':0')
+    metric = CountingMetric('foo', 1, tags={'bar': ['baz']})
+    assert client.format(metric) == "foo:1|c|#bar:['baz']"
+    assert not len(client.templates)
+
+
+def test_subclass():
+    class Requests(CountingMetric):
+        __slots__ = ()
+
+    client = aiomeasures.Datadog(':0')
+    assert client.format(Requests('requests', 1)) == 'requests:1|c'
+
+
+def test_dialect():
+    dialect = Dialect('Tagless', {'c': 'c', 'h': 'ms'}, tags=False)
+    templates = Templates(dialect)
+    metric = aiomeasures.HistogramMetric('foo', 42, tags={'bar': 'baz'})
+    assert templates.format(metric, tags=['env:prod']) == 'foo:42|ms'
+    assert DOGSTATSD.format(metric) == 'foo:42|h|#bar:baz'
+    with pytest.raises(ValueError):
+        dialect.format(GaugeMetric('foo', 1))
+    with pytest.raises(ValueError):
+        dialect.format(Event('title', 'text'))
+    with pytest.raises(ValueError):
+        dialect.format('foo:1|c')
@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from aiomeasures import Aggregator, Datadog
+from concurrent.futures import ThreadPoolExecutor
+
+
+def total(lines):
+    return sum(int(line.split(':')[1].split('|')[0]) for line in lines)
+
+
+@pytest.mark.asyncio
+def test_executor_stress(event_loop, udp_server):
+    client = Datadog(udp_server.address, flush_interval=.01, capacity=None,
+                     aggregator=Aggregator(sketches=True))
+    client.start()
+
+    def work(n):
+        for i in range(5000):
+            client.incr('jobs', tags={'worker': n % 4})
+            with client.timer('job'):
+                pass
+
+    executor = ThreadPoolExecutor(16)
+    yield from asyncio.gather(*[
+        event_loop.run_in_executor(executor, work, n) for n in range(32)])
+    executor.shutdown()
+    yield from client.aclose()
+    yield from asyncio.sleep(.1)
+
+    counters = [line for line in udp_server.msg if line.startswith('jobs:')]
+    timings = [line for line in udp_server.msg if line.startswith('job.count:')]
+    assert total(counters) == 32 * 5000
+    assert total(timings) == 32 * 5000
+    assert client.dropped == 0
+
+
+@pytest.mark.asyncio
+def test_executor_without_flusher(event_loop, monkeypatch, udp_server):
+    client = Datadog(udp_server.address, aggregator=Aggregator())
+    calls = []
+    call_soon_threadsafe = event_loop.call_soon_threadsafe
+
+    def counted(callback, *args):
+        calls.append(callback)
+        return call_soon_threadsafe(callback, *args)
+    monkeypatch.setattr(event_loop, 'call_soon_threadsafe', counted)
+
+    def work():
+        for i in range(1000):
+            client.incr('jobs')
+
+    yield from event_loop.run_in_executor(None, work)
+    yield from asyncio.sleep(.1)
+    assert total(udp_server.msg) == 1000
+    # far less wake ups than metrics
+    assert 1 <= len(calls) < 100
+    client.close()
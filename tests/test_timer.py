@@ -0,0 +1,130 @@
+import aiomeasures
+import asyncio
+import pytest
+import threading
+import time
+
+
+class Recorder(aiomeasures.Datadog):
+
+    def register(self, metric):
+        self.collector.append(metric)
+        return metric
+
+
+def timings(client):
+    return [metric.value for metric in client.collector]
+
+
+def test_context_manager():
+    client = Recorder(':0')
+    timer = client.timer('foo')
+    with timer as value:
+        assert value is timer
+        with timer:
+            pass
+    assert len(timings(client)) == 2
+
+
+def test_context_manager_threads():
+    client = Recorder(':0')
+    timer = client.timer('foo')
+    first, second = threading.Event(), threading.Event()
+
+    def short():
+        with timer:
+            first.set()
+            second.wait()
+            time.sleep(.02)
+
+    def long():
+        first.wait()
+        time.sleep(.05)
+        with timer:
+            second.set()
+            time.sleep(.1)
+
+    threads = [threading.Thread(target=short), threading.Thread(target=long)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 70ms and 100ms, not 20ms and 150ms with a single stack
+    values = sorted(timings(client))
+    assert 70 <= values[0] < 100
+    assert 100 <= values[1] < 140
+    assert not timer._starts
+
+
+def test_decorator():
+    client = Recorder(':0')
+
+    @client.timer('foo')
+    def func(a, b=None):
+        """Doc"""
+        return a, b
+
+    assert func(1, b=2) == (1, 2)
+    assert func.__doc__ == 'Doc'
+    assert len(timings(client)) == 1
+
+
+@pytest.mark.asyncio
+def test_coroutine_decorator(event_loop):
+    client = Recorder(':0', loop=event_loop)
+
+    @client.timer('foo')
+    @asyncio.coroutine
+    def func(delay):
+        yield from asyncio.sleep(delay)
+        return delay
+
+    assert asyncio.iscoroutinefunction(func)
+    results = yield from asyncio.gather(func(.05), func(.02), func(.1))
+    assert results == [.05, .02, .1]
+    assert sorted(timings(client)) >= [20, 50, 100]
+    assert max(timings(client)) < 150
+
+
+@pytest.mark.asyncio
+def test_async_context_manager(event_loop):
+    client = Recorder(':0', loop=event_loop)
+    timer = client.timer('foo')
+
+    @asyncio.coroutine
+    def work(delay):
+        yield from timer.__aenter__()
+        try:
+            yield from asyncio.sleep(delay)
+        finally:
+            yield from timer.__aexit__(None, None, None)
+
+    yield from asyncio.gather(work(.1), work(.02))
+    values = sorted(timings(client))
+    assert 20 <= values[0] < 90
+    assert 100 <= values[1] < 150
+    assert not timer._starts
+
+
+def test_precision():
+    client = Recorder(':0')
+    with client.timer('fast', precision=3):
+        pass
+    with client.timer('truncated'):
+        pass
+    fast, truncated = client.collector
+    assert isinstance(fast.value, aiomeasures.Milliseconds)
+    assert 0 < fast.value < 1
+    assert truncated.value == 0
+    line = client.format(fast)
+    assert line.startswith('fast:0.')
+    assert len(line.partition(':')[2].partition('|')[0]) == 5
+
+
+def test_milliseconds():
+    client = Recorder(':0')
+    value = aiomeasures.Milliseconds(0.123456, 4)
+    assert str(value) == '0.1235'
+    assert value == 0.123456
+    metric = aiomeasures.TimingMetric('foo', value)
+    assert client.format(metric) == 'foo:0.1235|ms'
@@ -0,0 +1,84 @@
+import aiomeasures
+import asyncio
+import contextlib
+import pytest
+
+
+class Recorder(aiomeasures.Datadog):
+
+    def register(self, metric):
+        self.collector.append(metric)
+        return metric
+
+
+def timings(client):
+    return [metric.value for metric in client.collector]
+
+
+@pytest.mark.asyncio
+async def test_async_def(event_loop):
+    client = Recorder(':0', loop=event_loop)
+
+    @client.timer('foo')
+    async def func(delay):
+        await asyncio.sleep(delay)
+        return delay
+
+    assert await func(.05) == .05
+    assert 50 <= timings(client)[0] < 100
+
+
+@pytest.mark.asyncio
+async def test_async_with(event_loop):
+    client = Recorder(':0', loop=event_loop)
+    timer = client.timer('foo')
+
+    async def work(delay):
+        async with timer:
+            await asyncio.sleep(delay)
+
+    await asyncio.gather(work(.1), work(.02))
+    values = sorted(timings(client))
+    assert 20 <= values[0] < 90
+    assert 100 <= values[1] < 150
+
+
+@pytest.mark.asyncio
+async def test_async_generator(event_loop):
+    client = Recorder(':0', loop=event_loop)
+
+    @client.timer('foo')
+    async def produce(count):
+        for i in range(count):
+            await asyncio.sleep(.01)
+            yield i
+
+    assert [i async for i in produce(5)] == [0, 1, 2, 3, 4]
+    assert 50 <= timings(client)[0] < 100
+
+    iterator = produce(5)
+    assert await iterator.__anext__() == 0
+    await iterator.aclose()
+    assert len(timings(client)) == 2
+
+
+@pytest.mark.skipif(not hasattr(contextlib, 'asynccontextmanager'),
+                    reason='asynccontextmanager requires Python 3.7')
+@pytest.mark.asyncio
+async def test_async_context_manager(event_loop):
+    client = Recorder(':0', loop=event_loop)
+
+    @contextlib.asynccontextmanager
+    @client.timer('foo')
+    async def session():
+        await asyncio.sleep(.01)
+        yield 'session'
+
+    async with session() as value:
+        assert value == 'session'
+    assert len(timings(client)) == 1
+
+    with pytest.raises(KeyError):
+        async with session():
+            raise KeyError('boom')
+    assert len(timings(client)) == 2